@@ -0,0 +1,300 @@
+import time
+from Game import Game
+from BitBoard import BitBoard
+
+# A classical search player that needs no network: iterative deepening alpha-beta (negamax) over the legal moves, with a
+# transposition table keyed by the zobrist hash, move ordering, a quiescence search of captures at the leaves, and an evaluation
+# from material and piece-square tables. It searches a BitBoard copy of the game, so it is a cheap reference opponent for pit.
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_PLY = 64 # the quiescence search stops here, checks can otherwise keep it going
+
+# transposition table entry bounds
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+piece_values = {"Pawn": 100, "Knight": 320, "Bishop": 330, "Rook": 500, "Queen": 900, "King": 0}
+
+# piece-square tables for white in the usual printed order, from a8 to h8 on the first line down to a1 to h1 on the last
+pawn_table = [ 0,  0,  0,  0,  0,  0,  0,  0,
+              50, 50, 50, 50, 50, 50, 50, 50,
+              10, 10, 20, 30, 30, 20, 10, 10,
+               5,  5, 10, 25, 25, 10,  5,  5,
+               0,  0,  0, 20, 20,  0,  0,  0,
+               5, -5,-10,  0,  0,-10, -5,  5,
+               5, 10, 10,-20,-20, 10, 10,  5,
+               0,  0,  0,  0,  0,  0,  0,  0]
+knight_table = [-50,-40,-30,-30,-30,-30,-40,-50,
+                -40,-20,  0,  0,  0,  0,-20,-40,
+                -30,  0, 10, 15, 15, 10,  0,-30,
+                -30,  5, 15, 20, 20, 15,  5,-30,
+                -30,  0, 15, 20, 20, 15,  0,-30,
+                -30,  5, 10, 15, 15, 10,  5,-30,
+                -40,-20,  0,  5,  5,  0,-20,-40,
+                -50,-40,-30,-30,-30,-30,-40,-50]
+bishop_table = [-20,-10,-10,-10,-10,-10,-10,-20,
+                -10,  0,  0,  0,  0,  0,  0,-10,
+                -10,  0,  5, 10, 10,  5,  0,-10,
+                -10,  5,  5, 10, 10,  5,  5,-10,
+                -10,  0, 10, 10, 10, 10,  0,-10,
+                -10, 10, 10, 10, 10, 10, 10,-10,
+                -10,  5,  0,  0,  0,  0,  5,-10,
+                -20,-10,-10,-10,-10,-10,-10,-20]
+rook_table = [ 0,  0,  0,  0,  0,  0,  0,  0,
+               5, 10, 10, 10, 10, 10, 10,  5,
+              -5,  0,  0,  0,  0,  0,  0, -5,
+              -5,  0,  0,  0,  0,  0,  0, -5,
+              -5,  0,  0,  0,  0,  0,  0, -5,
+              -5,  0,  0,  0,  0,  0,  0, -5,
+              -5,  0,  0,  0,  0,  0,  0, -5,
+               0,  0,  0,  5,  5,  0,  0,  0]
+queen_table = [-20,-10,-10, -5, -5,-10,-10,-20,
+               -10,  0,  0,  0,  0,  0,  0,-10,
+               -10,  0,  5,  5,  5,  5,  0,-10,
+                -5,  0,  5,  5,  5,  5,  0, -5,
+                 0,  0,  5,  5,  5,  5,  0, -5,
+               -10,  5,  5,  5,  5,  5,  0,-10,
+               -10,  0,  5,  0,  0,  0,  0,-10,
+               -20,-10,-10, -5, -5,-10,-10,-20]
+king_table = [-30,-40,-40,-50,-50,-40,-40,-30,
+              -30,-40,-40,-50,-50,-40,-40,-30,
+              -30,-40,-40,-50,-50,-40,-40,-30,
+              -30,-40,-40,-50,-50,-40,-40,-30,
+              -20,-30,-30,-40,-40,-30,-30,-20,
+              -10,-20,-20,-20,-20,-20,-20,-10,
+               20, 20,  0,  0,  0,  0, 20, 20,
+               20, 30, 10,  0,  0, 10, 30, 20]
+
+# piece_square_values[code][sq] is the value of the piece with that code (the BitBoard mailbox code) on that square for white,
+# black pieces use the tables flipped vertically and count negatively
+piece_square_values = []
+for team in [True, False]:
+    for name, table in [("Pawn", pawn_table), ("Knight", knight_table), ("Bishop", bishop_table), ("Rook", rook_table), ("Queen", queen_table), ("King", king_table)]:
+        values = []
+        for sq in range(64):
+            row, col = divmod(sq if team else sq ^ 56, 8)
+            values.append((piece_values[name] + table[((7 - row) * 8) + col]) * (1 if team else -1))
+        piece_square_values.append(values)
+
+def evaluate(board): # the score of a BitBoard position in centipawns for the team to move
+    score = 0
+    mailbox = board.mailbox
+    for sq in range(64):
+        code = mailbox[sq]
+        if (code != -1):
+            score += piece_square_values[code][sq]
+    return score if board.team_to_move else -score
+
+
+class AlphaBeta:
+    def __init__(self, max_depth = 4, time_limit = None, max_nodes = None, table_size = 1 << 18):
+        # the search deepens up to max_depth plies, stopping early after time_limit seconds or max_nodes nodes if they are given
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+
+        # the transposition table is a fixed number of slots indexed by the low bits of the board hash, each holding
+        # (board hash, depth, bound, score, packed best move, search number) or None
+        self.table_mask = table_size - 1
+        self.table = [None] * table_size
+        self.search_number = 0 # entries from earlier searches are always replaced, otherwise only by searches at least as deep
+
+        self.killers = [[-1, -1] for _ in range(MAX_PLY + 1)] # quiet moves that caused a cutoff at each ply
+        self.history = [[0] * 4096, [0] * 4096] # cutoff counts of quiet moves by team and start and end square
+
+        # the state of the current search, and what the last finished iteration of the last search found
+        self.nodes = 0
+        self.stopped = False
+        self.start_time = 0
+        self.score = 0 # in centipawns for the team to move at the root
+        self.depth = 0 # the deepest iteration that finished
+
+    def get_move(self, game):
+        # the best move found for the game's current position, taken from the game's own legal moves
+        moves = game.get_legal_moves()
+        if (len(moves) == 0):
+            return None
+        code = self.search(game)
+        for move in moves:
+            if (move.pack() == code):
+                return move
+        return moves[0]
+
+    def search(self, game): # returns the packed best move
+        # the search plays moves on a BitBoard copy of the position that keeps the game's repetition window
+        search_game = Game(board = BitBoard(snapshot = game.board.snapshot()))
+        search_game.hash_history = game.hash_history[-1 - game.reversible_window():]
+
+        self.search_number += 1
+        self.nodes = 0
+        self.stopped = False
+        self.start_time = time.perf_counter()
+        self.killers = [[-1, -1] for _ in range(MAX_PLY + 1)]
+        self.score = 0
+        self.depth = 0
+
+        best_code = search_game.get_legal_moves()[0].pack()
+        for depth in range(1, self.max_depth + 1):
+            score = self.negamax(search_game, depth, -INFINITY, INFINITY, 0)
+            if (self.stopped):
+                break # the unfinished iteration is thrown away
+            entry = self.table[search_game.get_board_hash() & self.table_mask]
+            if (entry != None and entry[0] == search_game.get_board_hash() and entry[4] != -1):
+                best_code = entry[4]
+            self.score = score
+            self.depth = depth
+            if (abs(score) > MATE_SCORE - MAX_PLY): # a forced mate was found, searching deeper won't change the move
+                break
+        return best_code
+
+    def out_of_time(self):
+        if (self.max_nodes != None and self.nodes >= self.max_nodes):
+            self.stopped = True
+        elif (self.time_limit != None and (self.nodes & 255) == 0 and time.perf_counter() - self.start_time >= self.time_limit):
+            self.stopped = True
+        return self.stopped
+
+    def probe(self, board_hash):
+        entry = self.table[board_hash & self.table_mask]
+        if (entry != None and entry[0] == board_hash):
+            return entry
+        return None
+
+    def store(self, board_hash, depth, bound, score, code):
+        index = board_hash & self.table_mask
+        entry = self.table[index]
+        if (entry == None or entry[0] == board_hash or entry[5] != self.search_number or depth >= entry[1]):
+            self.table[index] = (board_hash, depth, bound, score, code, self.search_number)
+
+    def order_moves(self, moves, tt_code, ply, team):
+        # returns (packed move, move) pairs, best first: the table's move, captures by most valuable victim and then least valuable
+        # attacker, promotions, the killer moves of this ply, and the other quiet moves by how often they caused cutoffs
+        killers = self.killers[ply]
+        history = self.history[0 if team else 1]
+        scored = []
+        for move in moves:
+            code = move.pack()
+            if (code == tt_code):
+                score = 10000000
+            elif (move.is_capture):
+                score = 1000000 + (10 * piece_values[move.capture_name]) - piece_values[move.piece_name]
+            elif (move.is_promotion):
+                score = 900000 + piece_values[move.piece_name]
+            elif (code == killers[0]):
+                score = 800000
+            elif (code == killers[1]):
+                score = 700000
+            else:
+                score = history[code & 4095]
+            scored.append((score, code, move))
+        scored.sort(key = lambda item: item[0], reverse = True)
+        return [(code, move) for score, code, move in scored]
+
+    def negamax(self, game, depth, alpha, beta, ply):
+        self.nodes += 1
+        if (self.out_of_time()):
+            return 0
+        board = game.board
+        if (ply > 0 and (board.moves_since_advancement >= 100 or game.times_at_board() > 1 or board.insufficient_material())):
+            return 0 # a repetition is scored as a draw the first time, the opponent could always repeat again
+
+        in_check = board.team_in_check(board.team_to_move)
+        if (in_check):
+            depth += 1 # checks are searched a ply deeper so forced sequences aren't cut off at the horizon
+        if (depth <= 0 or ply >= MAX_PLY):
+            return self.quiescence(game, alpha, beta, ply)
+
+        board_hash = game.get_board_hash()
+        tt_code = -1
+        entry = self.probe(board_hash)
+        if (entry != None):
+            tt_code = entry[4]
+            if (ply > 0 and entry[1] >= depth):
+                score = score_from_table(entry[3], ply)
+                if (entry[2] == EXACT or (entry[2] == LOWER and score >= beta) or (entry[2] == UPPER and score <= alpha)):
+                    return score
+
+        moves = game.get_legal_moves()
+        if (len(moves) == 0):
+            return (-MATE_SCORE + ply) if in_check else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_code = -1
+        for code, move in self.order_moves(moves, tt_code, ply, board.team_to_move):
+            game.do_move(move)
+            score = -self.negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            game.undo_move()
+            if (self.stopped):
+                return 0
+            if (score > best_score):
+                best_score = score
+                best_code = code
+            if (score > alpha):
+                alpha = score
+            if (alpha >= beta):
+                if (not move.is_capture and not move.is_promotion):
+                    if (self.killers[ply][0] != code):
+                        self.killers[ply] = [code, self.killers[ply][0]]
+                    self.history[0 if board.team_to_move else 1][code & 4095] += depth * depth
+                break
+
+        if (best_score <= original_alpha):
+            bound = UPPER
+        elif (best_score >= beta):
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.store(board_hash, depth, bound, score_to_table(best_score, ply), best_code)
+        return best_score
+
+    def quiescence(self, game, alpha, beta, ply):
+        # only captures and promotions are searched, so the position is evaluated once it is quiet, unless the team to move is
+        # in check, where every move is searched since standing pat isn't an option
+        self.nodes += 1
+        if (self.out_of_time()):
+            return 0
+        board = game.board
+        in_check = board.team_in_check(board.team_to_move)
+        moves = game.get_legal_moves()
+        if (len(moves) == 0):
+            return (-MATE_SCORE + ply) if in_check else 0
+        if (ply >= MAX_PLY):
+            return evaluate(board)
+
+        if (not in_check):
+            stand_pat = evaluate(board)
+            if (stand_pat >= beta):
+                return stand_pat
+            if (stand_pat > alpha):
+                alpha = stand_pat
+            moves = [move for move in moves if move.is_capture or move.is_promotion]
+
+        for code, move in self.order_moves(moves, -1, ply, board.team_to_move):
+            game.do_move(move)
+            score = -self.quiescence(game, -beta, -alpha, ply + 1)
+            game.undo_move()
+            if (self.stopped):
+                return 0
+            if (score >= beta):
+                return score
+            if (score > alpha):
+                alpha = score
+        return alpha
+
+
+def score_to_table(score, ply): # mate scores are stored as distances from the stored position instead of from the root
+    if (score > MATE_SCORE - MAX_PLY * 2):
+        return score + ply
+    elif (score < -MATE_SCORE + MAX_PLY * 2):
+        return score - ply
+    return score
+
+def score_from_table(score, ply):
+    if (score > MATE_SCORE - MAX_PLY * 2):
+        return score - ply
+    elif (score < -MATE_SCORE + MAX_PLY * 2):
+        return score + ply
+    return score
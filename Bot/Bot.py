@@ -1,20 +1,27 @@
 import sys, random
 sys.path.append('../ChessEngine/')
 from MonteCarloTreeSearch import MCTS
-from Game import Game
+from AlphaBeta import AlphaBeta
+from Game import Game, mover_reward
+from Move import get_nnet_indices
+from GameRecord import GameRecordWriter
+from Tablebase import Tablebase
 from NNet import init_nnet, train_nnet
 import numpy as np
 import tensorflow as tf
 import time
 
-def do_self_play(num_iters, num_episodes, display = None):
+def do_self_play(num_iters, num_episodes, display = None, record_path = None, record_format = 'pgn', tablebase_path = None): # record_path optionally names a file to append every game to,
+                                                                                                                          # and tablebase_path a directory of endgame tables that end games early
     nnet = init_nnet()
     nnet.load_weights('weights/model_08_weights')
+    record = GameRecordWriter(record_path, record_format) if record_path != None else None
+    tablebase = Tablebase(tablebase_path) if tablebase_path != None else None
     examples = []
     improvements = 8
     for i in range(num_iters):
         for e in range(num_episodes):
-            example = execute_episode(nnet, display)
+            example = execute_episode(nnet, display, record, tablebase)
             examples += example
 
         # examples[0] has gamestate neural network inputs
@@ -23,7 +30,7 @@ def do_self_play(num_iters, num_episodes, display = None):
         print('generated examples')
         new_nnet = train_nnet(nnet, examples)
         print('trained new network')
-        win_percentage = pit(new_nnet, nnet, display)
+        win_percentage = pit(new_nnet, nnet, display, record = record, tablebase = tablebase)
         print('pit old and new networks')
         print('win percentage:')
         print(win_percentage)
@@ -32,9 +39,19 @@ def do_self_play(num_iters, num_episodes, display = None):
             improvements += 1
             nnet = new_nnet
             new_nnet.save_weights('weights/model_0' + str(improvements) + '_weights')
+    if (record != None):
+        record.close()
     return nnet
 
 def get_bot_move(game, nnet, whites_turn, mcts = None, examples = None, best_move_only = False, num_sims = 10): # 800 is probably too big for our tastes, but it is what AlphaZero used
+    if (isinstance(nnet, AlphaBeta)): # nnet can also be an alpha-beta searcher, which plays its best move without any network
+        move = nnet.get_move(game)
+        if (examples is not None):
+            policy = np.zeros([4672], np.dtype(float))
+            policy[move.get_nnet_index(whites_turn)] = 1
+            examples.append([game.get_nnet_inputs(), policy, None])
+        return move
+
     if (mcts is None):
         mcts = MCTS()
 
@@ -49,24 +66,16 @@ def get_bot_move(game, nnet, whites_turn, mcts = None, examples = None, best_mov
     if (examples is not None):
         examples.append([game.get_nnet_inputs(), policy, None]) # none is because we don't know what the desired result should be yet
     move = None
-    max_policy = -1
-    valid_moves = []
-    valid_move_probs = []
-    for test_move in game.get_legal_moves():
-        index = test_move.get_nnet_index(whites_turn)
-        policy_val = policy[index]
-        if (not best_move_only):
-            valid_moves.append(test_move)
-            valid_move_probs.append(policy_val)
-        elif (policy_val > max_policy): # find the maximum likelihood move that is legal
-            max_policy = policy_val
-            move = test_move
-
-    if (not best_move_only):
+    valid_moves = game.get_legal_moves()
+    valid_move_probs = policy[get_nnet_indices(valid_moves, whites_turn)]
+    if (best_move_only):
+        if (len(valid_moves) > 0):
+            move = valid_moves[np.argmax(valid_move_probs)] # find the maximum likelihood move that is legal
+    else:
         #print(valid_moves)
         #print(valid_move_probs)
         try:
-            move = np.random.choice(valid_moves, 1, p = valid_move_probs)[0]
+            move = valid_moves[np.random.choice(len(valid_moves), p = valid_move_probs)]
         except:
             print('couldnt randomly select move from policy')
             move = random.choice(game.get_legal_moves())
@@ -78,11 +87,12 @@ def get_bot_move(game, nnet, whites_turn, mcts = None, examples = None, best_mov
 
     return move
 
-def execute_episode(nnet, display):
+def execute_episode(nnet, display, record = None, tablebase = None): # record is an optional GameRecordWriter that the finished game is written to,
+                                                                   # tablebase an optional Tablebase that adjudicates the game once it reaches a table
     examples = []
     mcts = MCTS()
 
-    game = Game()
+    game = Game(tablebase = tablebase)
 
     if (display is not None):
         display.set_game(game)
@@ -102,7 +112,9 @@ def execute_episode(nnet, display):
             
         status = game.is_game_over(print_reason = True)
         if (status != -1):
-            examples = assign_rewards(examples, status)
+            if (record != None):
+                record.write_game(game, 'self-play', 'self-play')
+            examples = assign_rewards(examples, mover_reward(status))
             return examples
             
         whites_turn = not whites_turn
@@ -114,7 +126,7 @@ def assign_rewards(examples, reward):
 
     return examples
 
-def pit(nnet_one, nnet_two, display, num_games = 5):
+def pit(nnet_one, nnet_two, display, num_games = 5, record = None, tablebase = None): # either player can be an AlphaBeta searcher instead of a network
     num_wins = 0
     for i in range(num_games):
         print('------------------New game------------------')
@@ -131,7 +143,7 @@ def pit(nnet_one, nnet_two, display, num_games = 5):
         
         playing = True
         whites_turn = True
-        game = Game()
+        game = Game(tablebase = tablebase)
 
         if (display is not None):
             display.set_game(game)
@@ -153,10 +165,13 @@ def pit(nnet_one, nnet_two, display, num_games = 5):
             game.do_move(move)
             status = game.is_game_over(print_reason = True)
             if (status != -1):
+                if (record != None):
+                    new_white = (i < (num_games / 2))
+                    record.write_game(game, 'new net' if new_white else 'old net', 'old net' if new_white else 'new net')
                 if (status == 0):
                     print('new bot drew')
                     num_wins += 0.5
-                elif (whites_turn == (i < (num_games / 2))):
+                elif ((whites_turn == (i < (num_games / 2))) == (mover_reward(status) == 1)): # the new bot just moved and won, or the old bot just moved and lost
                     print('new bot won')
                     num_wins += 1
                     
@@ -1,6 +1,8 @@
 import numpy as np
 from math import sqrt
 import time
+from Move import get_nnet_indices
+from Game import mover_reward
 
 board_height = 8
 board_width = 8
@@ -26,43 +28,40 @@ class MCTS:
         # hyperparameter means that it is external to the model itself
         self.c_puct = 0.2
 
+        # a batch of one position that every leaf expansion writes its nnet inputs into
+        self.input_batch = np.zeros([1, board_height, board_width, num_channels], np.float32)
+
     def search(self, game, nnet):
         end_value = game.is_game_over()
         if (end_value != -1):
-            return -end_value
+            return mover_reward(end_value) # like -v below, the value is for the player who just moved, who won a checkmate
 
         s = game.get_board_hash()
 
         if (s not in self.visited):
             self.visited.add(s)
             
-            inputs = game.get_nnet_inputs()
-            inputs = np.array(inputs)
-            inputs = inputs.reshape(1, board_height, board_width, num_channels)
+            game.get_nnet_inputs(out = self.input_batch[0])
             
             #start = time.perf_counter()
-            policy, value = nnet(inputs)
+            policy, value = nnet(self.input_batch)
             #end = time.perf_counter()
             #print('nnet access took: ' + str(end - start))
             
-            self.P[s] = policy[0]
+            self.P[s] = np.asarray(policy[0])
             #print(self.P[s])
             v = value[0]
             self.Q[s] = np.zeros([4672], np.dtype(float))
             self.N[s] = np.zeros([4672], np.dtype(float))
             return -v
 
-        max_u, best_move, best_a = -float("inf"), -1, -1
-
-        for move in game.get_legal_moves():
-            a = move.get_nnet_index(game.get_team_to_move())
-            u = self.Q[s][a] + (self.c_puct * self.P[s][a] * np.sqrt(np.sum(self.N[s])) / (1 + self.N[s][a]))
-            if u > max_u:
-                max_u = u
-                best_move = move
-                best_a = a
-
-        #move = best_move
+        # the upper confidence bound of every legal move at once, gathered out of the arrays by policy index
+        moves = game.get_legal_moves()
+        a = get_nnet_indices(moves, game.get_team_to_move())
+        u = self.Q[s][a] + (self.c_puct * self.P[s][a] * np.sqrt(np.sum(self.N[s])) / (1 + self.N[s][a]))
+        best = np.argmax(u)
+        best_move = moves[best]
+        best_a = a[best]
 
         game.do_move(best_move)
         v = self.search(game, nnet)
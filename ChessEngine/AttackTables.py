@@ -0,0 +1,99 @@
+# Precomputed attack tables, built once at import time and shared by Board and BitBoard.
+# Squares are indexed (row * 8) + col, so square 0 is a1 and square 63 is h8.
+# Every table comes in two forms: lists of squares for walking the Board mailbox, and 64 bit integer masks for BitBoard.
+
+def on_board(row, col):
+    return (0 <= row < 8 and 0 <= col < 8)
+
+def offset_targets(offsets): # for each square, the list of squares reached by adding each (row, col) offset that stays on the board
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        targets = []
+        for d_row, d_col in offsets:
+            if (on_board(row + d_row, col + d_col)):
+                targets.append(((row + d_row) * 8) + col + d_col)
+        table.append(targets)
+    return table
+
+def to_masks(table):
+    masks = []
+    for targets in table:
+        mask = 0
+        for sq in targets:
+            mask |= 1 << sq
+        masks.append(mask)
+    return masks
+
+knight_targets = offset_targets([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+king_targets = offset_targets([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+pawn_targets = [offset_targets([(1, -1), (1, 1)]), offset_targets([(-1, -1), (-1, 1)])] # the squares a pawn attacks, index 0 is for white pawns, 1 for black pawns
+
+knight_attacks = to_masks(knight_targets)
+king_attacks = to_masks(king_targets)
+pawn_attacks = [to_masks(pawn_targets[0]), to_masks(pawn_targets[1])]
+
+# the first four directions increase the square index and the last four decrease it,
+# which decides whether the nearest blocker on a ray is its lowest or highest set bit
+directions = [(1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1)]
+rook_directions = [0, 1, 4, 5]
+bishop_directions = [2, 3, 6, 7]
+is_rook_direction = [(d_row * d_col == 0) for d_row, d_col in directions]
+
+# ray_squares[square][direction] lists the squares from the square to the edge of the board in that direction, nearest first
+ray_squares = []
+for sq in range(64):
+    square_rays = []
+    for d_row, d_col in directions:
+        row, col = divmod(sq, 8)
+        ray = []
+        row += d_row
+        col += d_col
+        while (on_board(row, col)):
+            ray.append((row * 8) + col)
+            row += d_row
+            col += d_col
+        square_rays.append(ray)
+    ray_squares.append(square_rays)
+
+rays = [] # rays[direction][square] is the mask of ray_squares[square][direction]
+for d in range(8):
+    rays.append(to_masks([ray_squares[sq][d] for sq in range(64)]))
+
+# between[a][b] has the squares strictly between a and b if they share a row, column or diagonal, otherwise 0
+between = [[0] * 64 for _ in range(64)]
+for d in range(8):
+    for a in range(64):
+        ray = rays[d][a]
+        while (ray):
+            b = (ray & -ray).bit_length() - 1
+            between[a][b] = rays[d][a] & ~rays[d][b] & ~(1 << b)
+            ray &= ray - 1
+
+def slider_attacks(sq, occ, dirs):
+    attacks = 0
+    for d in dirs:
+        ray = rays[d][sq]
+        blockers = ray & occ
+        if (blockers):
+            if (d < 4):
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= rays[d][blocker]
+        attacks |= ray
+    return attacks
+
+def rook_attacks(sq, occ):
+    return slider_attacks(sq, occ, rook_directions)
+
+def bishop_attacks(sq, occ):
+    return slider_attacks(sq, occ, bishop_directions)
+
+def squares_of(bb):
+    squares = []
+    while (bb):
+        low_bit = bb & -bb
+        squares.append(low_bit.bit_length() - 1)
+        bb ^= low_bit
+    return squares
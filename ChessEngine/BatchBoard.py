@@ -0,0 +1,336 @@
+import numpy as np
+from BoardState import Board, zobrist_keys, castling_keys, castling_masks, num_nnet_channels
+from BitBoard import BitBoard, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY, piece_types, piece_keys, nnet_channels, EVEN_SQUARES
+from AttackTables import knight_targets, king_targets, pawn_targets, ray_squares, rook_directions, bishop_directions
+from Move import unpack_move, policy_indices, START_SHIFT, END_SHIFT, PIECE_SHIFT, CAPTURE_SHIFT, PROMOTION_FLAG, EP_FLAG, QS_CASTLE_FLAG, KS_CASTLE_FLAG
+from Snapshot import Snapshot, bitboards_from_mailbox
+from Fen import parse_fen, start_fen
+from Game import Game
+
+# BatchBoard holds N positions as numpy arrays and makes moves, generates legal moves, finds finished games and builds the nnet
+# inputs for all of them at once, so many self-play games can step together and send the network one large batch.
+# squares[i] is the mailbox of position i in the same piece codes as BitBoard and Snapshot (type + 6 for black, -1 for empty),
+# with an extra 65th square that is always empty. the lookup tables below are padded with that square (OFF) wherever a piece
+# would leave the board, so they can be indexed without any bounds checks.
+# moves are passed around as (board index, packed move) arrays, using the packed layout of Move.pack.
+
+OFF = 64
+
+def padded_table(table, width): # a list of square lists as an array, padded out to width with OFF
+    return np.array([targets + [OFF] * (width - len(targets)) for targets in table] + [[OFF] * width], np.dtype(int))
+
+knight_table = padded_table(knight_targets, 8)
+king_table = padded_table(king_targets, 8)
+pawn_table = np.array([padded_table(pawn_targets[0], 2), padded_table(pawn_targets[1], 2)]) # index 0 white pawns, 1 black pawns
+ray_table = np.array([padded_table(ray_squares[sq], 7)[:8] for sq in range(64)] + [np.full([8, 7], OFF)]) # [square, direction, step]
+slider_types = np.array([ROOK if d in rook_directions else BISHOP for d in range(8)]) # the slider besides the queen that moves in each direction
+
+castling_mask_table = np.array(castling_masks, np.dtype(int))
+promotion_types = np.array([QUEEN, KNIGHT, ROOK, BISHOP])
+policy_index_table = np.array(policy_indices, np.dtype(int))
+
+# zobrist keys as arrays, with an extra zero row or entry for indexing with -1 (an empty square or no en passant)
+piece_key_table = np.array(piece_keys + [[0] * 64], np.dtype(np.uint64))
+castling_key_table = np.array(castling_keys, np.dtype(np.uint64))
+en_passant_key_table = np.array(zobrist_keys[5:13] + [0], np.dtype(np.uint64))
+side_key = np.uint64(zobrist_keys[0])
+
+even_squares = np.array([bool(EVEN_SQUARES & (1 << sq)) for sq in range(64)])
+
+def squares_attacked(squares, targets, by_black):
+    # for each row of squares (any number of mailboxes), whether its target square is attacked by black (by_black True) or white
+    rows = np.arange(len(targets))[:, None]
+    offset = np.where(by_black, 6, 0)[:, None]
+    attacked = np.any(squares[rows, knight_table[targets]] == KNIGHT + offset, axis = 1)
+    attacked |= np.any(squares[rows, king_table[targets]] == KING + offset, axis = 1)
+    # the pawns attacking a square are on the squares a pawn of the other team would attack from it
+    attacked |= np.any(squares[rows, pawn_table[np.where(by_black, 0, 1), targets]] == PAWN + offset, axis = 1)
+    # along each ray the nearest piece attacks the square if it is an enemy queen or slider of the ray's kind
+    ray_pieces = squares[rows[:, :, None], ray_table[targets]]
+    occupied = ray_pieces != EMPTY
+    nearest = np.take_along_axis(ray_pieces, np.argmax(occupied, axis = 2)[:, :, None], axis = 2)[:, :, 0]
+    sliders = np.any(occupied, axis = 2) & ((nearest == slider_types + offset) | (nearest == QUEEN + offset))
+    return attacked | np.any(sliders, axis = 1)
+
+def apply_moves(squares, moves, team_offsets):
+    # makes one packed move on each row of squares in place, team_offsets is 0 for rows where white moves and 6 for black
+    rows = np.arange(len(moves))
+    start_sq = (moves >> START_SHIFT) & 63
+    end_sq = (moves >> END_SHIFT) & 63
+    new_codes = ((moves >> PIECE_SHIFT) & 7) - 1 + team_offsets # the piece name of a promotion is what the pawn becomes
+    capture_sq = np.where(moves & EP_FLAG, (start_sq & ~7) | (end_sq & 7), OFF) # the en passant pawn is beside the capturing one
+    rook_start = np.where(moves & QS_CASTLE_FLAG, start_sq - 4, np.where(moves & KS_CASTLE_FLAG, start_sq + 3, OFF))
+    rook_end = np.where(moves & QS_CASTLE_FLAG, start_sq - 1, np.where(moves & KS_CASTLE_FLAG, start_sq + 1, OFF))
+    squares[rows, start_sq] = EMPTY
+    squares[rows, capture_sq] = EMPTY
+    squares[rows, end_sq] = new_codes
+    rooks = squares[rows, rook_start]
+    squares[rows, rook_start] = EMPTY
+    squares[rows, rook_end] = rooks # an EMPTY rook when there is no castle, which leaves OFF empty
+    return squares
+
+
+class BatchBoard:
+    def __init__(self, num_boards = 1, fen = None): # num_boards copies of the fen's position, or of the initial position
+        position = parse_fen(start_fen if fen == None else fen)
+        if (position == None):
+            position = parse_fen(start_fen)
+        placement, team_to_move, castling_flags, en_passant_col, moves_since_advancement, total_moves = position
+
+        mailbox = [EMPTY] * 65
+        for name, team, row, col in placement:
+            mailbox[(row * 8) + col] = piece_types[name] + (0 if team else 6)
+        self.squares = np.tile(np.array(mailbox, np.int8), (num_boards, 1))
+        self.team_to_move = np.full(num_boards, team_to_move)
+        self.castling = np.full(num_boards, castling_flags, np.dtype(int))
+        self.en_passant_col = np.full(num_boards, en_passant_col, np.dtype(int))
+        self.moves_since_advancement = np.full(num_boards, moves_since_advancement, np.dtype(int))
+        self.total_moves = np.full(num_boards, total_moves, np.dtype(int))
+        self.hash_history = [] # the board hashes of every earlier position, one array per ply, for finding repetitions
+        self.update_hashes()
+
+    def __len__(self):
+        return len(self.squares)
+
+    def update_hashes(self): # the hashes are recomputed for the whole batch after every step, which numpy does in one pass
+        keys = piece_key_table[self.squares[:, :64], np.arange(64)]
+        self.board_hash = np.bitwise_xor.reduce(keys, axis = 1) ^ np.where(self.team_to_move, np.uint64(0), side_key)
+        self.board_hash ^= castling_key_table[self.castling] ^ en_passant_key_table[self.en_passant_col]
+        self.legal_moves = None
+
+    def get_board_hashes(self):
+        return self.board_hash
+
+    def team_offsets(self): # 0 where white is moving and 6 where black is, the amount added to a piece type to get the mover's code
+        return np.where(self.team_to_move, 0, 6)
+
+    def in_check(self):
+        king_squares = np.argmax(self.squares[:, :64] == (KING + self.team_offsets())[:, None], axis = 1)
+        return squares_attacked(self.squares, king_squares, self.team_to_move)
+
+    def gen_pseudo_legal_moves(self):
+        # every move that follows the piece movement rules, as (board index, packed move) arrays, without checking for check
+        squares = self.squares
+        codes = squares[:, :64].astype(np.dtype(int))
+        types = np.where(codes != EMPTY, codes % 6, EMPTY)
+        black = ~self.team_to_move
+        ours = np.zeros(squares.shape, np.dtype(bool))
+        ours[:, :64] = (codes != EMPTY) & ((codes >= 6) == black[:, None])
+        theirs = np.zeros(squares.shape, np.dtype(bool))
+        theirs[:, :64] = (codes != EMPTY) & ~ours[:, :64]
+        empty = ~(ours | theirs)
+        empty[:, OFF] = False
+
+        boards = []
+        starts = []
+        ends = []
+        pieces = []
+
+        def add(board, start, end, piece, ok): # board and start broadcast against end, ok selects the moves that can be made
+            board, start, end, piece = np.broadcast_arrays(board, start, end, piece)
+            boards.append(board[ok])
+            starts.append(start[ok])
+            ends.append(end[ok])
+            pieces.append(piece[ok])
+
+        for piece_type, table in [(KNIGHT, knight_table), (KING, king_table)]:
+            board, start = np.nonzero(ours[:, :64] & (types == piece_type))
+            end = table[start]
+            add(board[:, None], start[:, None], end, piece_type, (end != OFF) & ~ours[board[:, None], end])
+
+        for piece_type, directions in [(BISHOP, bishop_directions), (ROOK, rook_directions), (QUEEN, list(range(8)))]:
+            board, start = np.nonzero(ours[:, :64] & (types == piece_type))
+            end = ray_table[start][:, directions]
+            occupied = ~empty[board[:, None, None], end]
+            blocked = (np.cumsum(occupied, axis = 2) - occupied) > 0 # a piece earlier on the ray is in the way
+            add(board[:, None, None], start[:, None, None], end, piece_type, (end != OFF) & ~blocked & ~ours[board[:, None, None], end])
+
+        board, start = np.nonzero(ours[:, :64] & (types == PAWN))
+        pawn_black = black[board]
+        forward = np.where(pawn_black, -8, 8)
+        one = start + forward
+        add(board, start, one, PAWN, empty[board, one])
+        two = np.where((start // 8) == np.where(pawn_black, 6, 1), start + (2 * forward), OFF)
+        add(board, start, two, PAWN, empty[board, one] & empty[board, two])
+        end = pawn_table[pawn_black.astype(np.dtype(int)), start]
+        ep_squares = np.where(self.en_passant_col[board] != -1, (np.where(pawn_black, 2, 5) * 8) + self.en_passant_col[board], -1)
+        add(board[:, None], start[:, None], end, PAWN, theirs[board[:, None], end] | (end == ep_squares[:, None]))
+
+        board = np.concatenate(boards)
+        start = np.concatenate(starts)
+        end = np.concatenate(ends)
+        piece = np.concatenate(pieces)
+
+        # pawn moves to the last row become four promotions
+        promoting = (piece == PAWN) & (((end // 8) == 7) | ((end // 8) == 0))
+        board = np.concatenate([board[~promoting]] + [board[promoting]] * 4)
+        start = np.concatenate([start[~promoting]] + [start[promoting]] * 4)
+        end = np.concatenate([end[~promoting]] + [end[promoting]] * 4)
+        piece = np.concatenate([piece[~promoting]] + [np.full(np.count_nonzero(promoting), promotion) for promotion in promotion_types])
+        flags = np.concatenate([np.zeros(np.count_nonzero(~promoting), np.dtype(int)), np.full(4 * np.count_nonzero(promoting), PROMOTION_FLAG)])
+
+        captured = codes[board, end]
+        is_ep = (piece == PAWN) & (captured == EMPTY) & ((start % 8) != (end % 8))
+        captured = np.where(is_ep, PAWN, np.where(captured != EMPTY, captured % 6, EMPTY))
+        flags |= np.where(is_ep, EP_FLAG, 0)
+
+        moves = (start << START_SHIFT) | (end << END_SHIFT) | ((piece + 1) << PIECE_SHIFT) | ((captured + 1) << CAPTURE_SHIFT) | flags
+        return board, moves
+
+    def gen_castling_moves(self, in_check):
+        # castling can't be tested by making the move and looking for check, since the king also can't pass through an attacked square
+        boards = []
+        moves = []
+        home = np.where(self.team_to_move, 4, 60)
+        for flag_shift, empty_squares, transit in [(0, [-1, -2, -3], [-1, -2]), (1, [1, 2], [1, 2])]:
+            right = np.where(self.team_to_move, 1 << flag_shift, 4 << flag_shift)
+            can_castle = ((self.castling & right) != 0) & ~in_check
+            for offset in empty_squares:
+                can_castle &= self.squares[np.arange(len(self)), home + offset] == EMPTY
+            for offset in transit:
+                can_castle &= ~squares_attacked(self.squares, home + offset, self.team_to_move)
+            board = np.nonzero(can_castle)[0]
+            flag = QS_CASTLE_FLAG if flag_shift == 0 else KS_CASTLE_FLAG
+            boards.append(board)
+            moves.append((home[board] << START_SHIFT) | ((home[board] + (2 * transit[0])) << END_SHIFT) | ((KING + 1) << PIECE_SHIFT) | flag)
+        return np.concatenate(boards), np.concatenate(moves)
+
+    def gen_legal_moves(self):
+        # the pseudo legal moves are all made at once on copies of their boards, and the ones that leave the mover's king attacked are dropped
+        board, moves = self.gen_pseudo_legal_moves()
+        offsets = self.team_offsets()[board]
+        children = apply_moves(self.squares[board], moves, offsets)
+        king_squares = np.argmax(children[:, :64] == (KING + offsets)[:, None], axis = 1)
+        legal = ~squares_attacked(children, king_squares, self.team_to_move[board])
+
+        castle_board, castle_moves = self.gen_castling_moves(self.in_check())
+        board = np.concatenate([board[legal], castle_board])
+        moves = np.concatenate([moves[legal], castle_moves])
+        order = np.argsort(board, kind = 'stable')
+        return board[order], moves[order]
+
+    def get_legal_moves(self): # (board index, packed move) arrays sorted by board, generated once per step
+        if (self.legal_moves is None):
+            self.legal_moves = self.gen_legal_moves()
+        return self.legal_moves
+
+    def legal_move_counts(self):
+        return np.bincount(self.get_legal_moves()[0], minlength = len(self))
+
+    def nnet_indices(self, board, moves): # the policy index of each (board index, packed move), see Move.get_nnet_index
+        piece = ((moves >> PIECE_SHIFT) & 7) - 1
+        promotion = np.where((moves & PROMOTION_FLAG) != 0, np.where(piece == QUEEN, 0, piece), 0) # knight 1, bishop 2 and rook 3
+        keys = ((((np.where(self.team_to_move[board], 0, 1) * 64) + ((moves >> START_SHIFT) & 63)) * 64) + ((moves >> END_SHIFT) & 63)) * 4 + promotion
+        return policy_index_table[keys]
+
+    def do_moves(self, moves): # makes one packed move on every board
+        start_sq = (moves >> START_SHIFT) & 63
+        end_sq = (moves >> END_SHIFT) & 63
+        piece = ((moves >> PIECE_SHIFT) & 7) - 1
+        is_pawn_move = (piece == PAWN) | ((moves & PROMOTION_FLAG) != 0)
+        is_capture = ((moves >> CAPTURE_SHIFT) & 7) != 0
+
+        self.hash_history.append(self.board_hash)
+        apply_moves(self.squares, moves, self.team_offsets())
+        self.castling = self.castling & castling_mask_table[start_sq] & castling_mask_table[end_sq]
+        self.en_passant_col = np.where((piece == PAWN) & (np.abs(end_sq - start_sq) == 16), start_sq % 8, -1)
+        self.moves_since_advancement = np.where(is_pawn_move | is_capture, 0, self.moves_since_advancement + 1)
+        self.total_moves = self.total_moves + 1
+        self.team_to_move = ~self.team_to_move
+        self.update_hashes()
+
+    def times_at_board(self): # how many times each board's current position has been reached, counting this time
+        times = np.ones(len(self), np.dtype(int))
+        for hashes in self.hash_history:
+            times += hashes == self.board_hash
+        return times
+
+    def insufficient_material(self): # see BoardState.insufficient_material
+        codes = self.squares[:, :64]
+        counts = np.stack([np.count_nonzero(codes == code, axis = 1) for code in range(12)], axis = 1)
+        enough = np.any(counts[:, [PAWN, ROOK, QUEEN, PAWN + 6, ROOK + 6, QUEEN + 6]] > 0, axis = 1)
+        enough |= (counts[:, BISHOP] > 1) | (counts[:, BISHOP + 6] > 1)
+        knights = counts[:, KNIGHT] + counts[:, KNIGHT + 6]
+        bishops = counts[:, BISHOP] + counts[:, BISHOP + 6]
+        enough |= (knights > 1) | ((knights > 0) & (bishops > 0))
+        white_even = np.count_nonzero((codes == BISHOP) & even_squares, axis = 1)
+        black_even = np.count_nonzero((codes == BISHOP + 6) & even_squares, axis = 1)
+        enough |= (bishops == 2) & (white_even != black_even)
+        return ~enough
+
+    def is_game_over(self): # Game.is_game_over for every board: -1 still going, 0 drawn, 1 checkmate, checked in the same order
+        status = np.where(self.legal_move_counts() == 0, np.where(self.in_check(), 1, 0), -1)
+        status = np.where(self.moves_since_advancement >= 100, 0, status)
+        status = np.where(self.times_at_board() == 3, 0, status)
+        return np.where(self.insufficient_material(), 0, status)
+
+    def nnet_inputs(self, out = None): # the inputs of Board.nnet_inputs for every board, as one [N, 8, 8, 20] array
+        if (out is None):
+            out = np.zeros([len(self), 8, 8, num_nnet_channels], np.float32)
+        else:
+            out[:] = 0
+        board, sq = np.nonzero(self.squares[:, :64] != EMPTY)
+        codes = self.squares[board, sq].astype(np.dtype(int))
+        rows = np.where(self.team_to_move[board], sq // 8, 7 - (sq // 8)) # the board needs to be input oriented according to the player moving
+        channels = np.array(nnet_channels)[codes % 6] + np.where((codes < 6) == self.team_to_move[board], 0, 6)
+        out[board, rows, sq % 8, channels] = 1
+
+        white_castling = [(self.castling & 1) == 0, (self.castling & 2) == 0]
+        black_castling = [(self.castling & 4) == 0, (self.castling & 8) == 0]
+        player_castling = np.where(self.team_to_move, white_castling, black_castling)
+        enemy_castling = np.where(self.team_to_move, black_castling, white_castling)
+        scalars = np.stack([np.where(self.team_to_move, 0, 1), self.total_moves, self.moves_since_advancement,
+                            player_castling[0], player_castling[1], enemy_castling[0], enemy_castling[1], self.times_at_board()], axis = 1)
+        out[:, :, :, 12:] = scalars[:, None, None, :]
+        return out
+
+    def select(self, indices): # a new batch with only the boards at indices, for example to drop the games that have finished
+        batch = BatchBoard.__new__(BatchBoard)
+        batch.squares = self.squares[indices]
+        batch.team_to_move = self.team_to_move[indices]
+        batch.castling = self.castling[indices]
+        batch.en_passant_col = self.en_passant_col[indices]
+        batch.moves_since_advancement = self.moves_since_advancement[indices]
+        batch.total_moves = self.total_moves[indices]
+        batch.board_hash = self.board_hash[indices]
+        batch.hash_history = [hashes[indices] for hashes in self.hash_history]
+        batch.legal_moves = None
+        return batch
+
+    def make_children(self, board, moves): # a new batch with one board for each (board index, packed move), after the move
+        batch = self.select(board)
+        batch.do_moves(moves)
+        return batch
+
+    def get_moves(self, i): # the legal moves of board i as Move objects
+        board, moves = self.get_legal_moves()
+        return [unpack_move(int(code)) for code in moves[board == i]]
+
+    def snapshot(self, i):
+        mailbox = tuple(int(code) for code in self.squares[i, :64])
+        return Snapshot(mailbox, bitboards_from_mailbox(mailbox), bool(self.team_to_move[i]), int(self.castling[i]), int(self.en_passant_col[i]),
+                        int(self.moves_since_advancement[i]), int(self.total_moves[i]), int(self.board_hash[i]))
+
+    def to_game(self, i, bitboard = False): # board i as a Game, with the repetition counts of its earlier positions
+        board = BitBoard(snapshot = self.snapshot(i)) if bitboard else Board(snapshot = self.snapshot(i))
+        game = Game(board = board)
+        game.hash_history = [int(hashes[i]) for hashes in self.hash_history] + [game.board_id]
+        return game
+
+    @classmethod
+    def from_snapshots(cls, snapshots):
+        batch = cls(len(snapshots))
+        for i in range(len(snapshots)):
+            snapshot = snapshots[i]
+            batch.squares[i, :64] = snapshot.mailbox
+            batch.team_to_move[i] = snapshot.team_to_move
+            batch.castling[i] = snapshot.castling_flags
+            batch.en_passant_col[i] = snapshot.en_passant_col
+            batch.moves_since_advancement[i] = snapshot.moves_since_advancement
+            batch.total_moves[i] = snapshot.total_moves
+        batch.update_hashes()
+        return batch
+
+    @classmethod
+    def from_games(cls, games): # the current positions of the games, without their histories
+        return cls.from_snapshots([game.board.snapshot() for game in games])
@@ -0,0 +1,582 @@
+import numpy as np
+import Pieces
+from Move import Move
+from Fen import parse_fen, make_fen
+from MoveCache import MoveCache
+from Snapshot import Snapshot
+from BoardState import zobrist_keys, zobrist_piece_key, castling_keys, castling_masks, num_nnet_channels, insufficient_material
+from AttackTables import knight_attacks, king_attacks, pawn_attacks, between, rook_attacks, bishop_attacks, squares_of
+
+# An alternative to BoardState.Board that stores the position as 64 bit integer bitboards, one per piece type and color,
+# instead of a Piece object per piece. It has the same interface as Board, so Game can use either one.
+# Square indices are (row * 8) + col, the same as the zobrist indices used by Board, so bit 0 is a1 and bit 63 is h8.
+
+# piece type indices, matching the order Board uses for its zobrist indices
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+# a piece code is its type index, plus 6 if the piece is black
+EMPTY = -1
+
+piece_names = ["Pawn", "Knight", "Bishop", "Rook", "Queen", "King"]
+piece_types = {"Pawn": PAWN, "Knight": KNIGHT, "Bishop": BISHOP, "Rook": ROOK, "Queen": QUEEN, "King": KING}
+piece_classes = [Pieces.Pawn, Pieces.Knight, Pieces.Bishop, Pieces.Rook, Pieces.Queen, Pieces.King]
+# the nnet input channel of each piece type, see Board.nnet_inputs
+nnet_channels = [0, 3, 2, 1, 4, 5]
+
+FULL = (1 << 64) - 1
+EVEN_SQUARES = sum(1 << sq for sq in range(64) if ((sq // 8) + (sq % 8)) % 2 == 0) # the squares where (row + col) % 2 is 0
+
+# castling rights are stored as the same 4 bit flags that Board.get_castling_flags uses, and lost through the same castling_masks
+WHITE_QS = 1
+WHITE_KS = 2
+BLACK_QS = 4
+BLACK_KS = 8
+
+# piece_keys[code][sq] is the zobrist key of the piece with that code on that square
+piece_keys = []
+for code in range(12):
+    piece_keys.append([zobrist_piece_key(piece_names[code % 6], code < 6, sq // 8, sq % 8) for sq in range(64)])
+
+
+class BitBoard:
+    def __init__(self, debug_hash = False, fen = None, snapshot = None): # fen or snapshot optionally give a position to start from instead of the initial one
+        self.num_rows = 8
+        self.num_cols = 8
+        self.en_passant_col = -1
+
+        self.team_to_move = True
+
+        self.moves_since_advancement = 0 # used to determine if the game is drawn
+        self.total_moves = 0
+
+        # the board hash is updated with a few xors on every move instead of being recomputed,
+        # debug_hash checks it against the full recomputation after every move and undo
+        self.debug_hash = debug_hash
+
+        self.legal_moves = None # None until the legal moves of the current position are asked for
+        self.move_cache = MoveCache()
+
+        if (snapshot != None):
+            self.restore(snapshot)
+        elif (fen == None or not self.set_fen(fen)):
+            self.reset_board()
+
+    def reset_board(self):
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0] # index 0: white pieces, index 1: black pieces
+        self.mailbox = [EMPTY] * 64 # the piece code on each square, so captures don't have to search the bitboards
+        self.castling = WHITE_QS | WHITE_KS | BLACK_QS | BLACK_KS
+
+        main_row = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+        for col in range(8):
+            self.put_piece(main_row[col], col)
+            self.put_piece(PAWN, 8 + col)
+            self.put_piece(PAWN + 6, 48 + col)
+            self.put_piece(main_row[col] + 6, 56 + col)
+
+        self.board_hash = self.calc_board_hash()
+        self.legal_moves = None
+
+    def set_fen(self, fen): # see Board.set_fen
+        position = parse_fen(fen)
+        if (position == None):
+            return False
+        placement, self.team_to_move, self.castling, self.en_passant_col, self.moves_since_advancement, self.total_moves = position
+
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0]
+        self.mailbox = [EMPTY] * 64
+        for name, team, row, col in placement:
+            self.put_piece(piece_types[name] + (0 if team else 6), (row * 8) + col)
+
+        self.board_hash = self.calc_board_hash()
+        self.legal_moves = None
+        return True
+
+    def get_fen(self):
+        squares = [None if code == EMPTY else (piece_names[code % 6], code < 6) for code in self.mailbox]
+        return make_fen(squares, self.team_to_move, self.castling, self.en_passant_col, self.moves_since_advancement, self.total_moves)
+
+    def snapshot(self): # see Board.snapshot
+        return Snapshot(tuple(self.mailbox), tuple(self.bitboards), self.team_to_move, self.castling, self.en_passant_col,
+                        self.moves_since_advancement, self.total_moves, self.board_hash)
+
+    def restore(self, snapshot): # only copies the snapshot's tuples back into lists, so it is cheap enough to use in place of undo_move
+        self.bitboards = list(snapshot.bitboards)
+        self.occupancy = [0, 0]
+        for code in range(12):
+            self.occupancy[code // 6] |= self.bitboards[code]
+        self.mailbox = list(snapshot.mailbox)
+        self.team_to_move = snapshot.team_to_move
+        self.castling = snapshot.castling_flags
+        self.en_passant_col = snapshot.en_passant_col
+        self.moves_since_advancement = snapshot.moves_since_advancement
+        self.total_moves = snapshot.total_moves
+
+        self.board_hash = snapshot.board_hash
+        if (self.debug_hash):
+            self.check_board_hash(None, 'restore')
+        self.legal_moves = None
+
+    @classmethod
+    def from_snapshot(cls, snapshot, debug_hash = False):
+        return cls(debug_hash, snapshot = snapshot)
+
+    def clone(self):
+        return self.from_snapshot(self.snapshot(), self.debug_hash)
+
+    def insufficient_material(self): # see BoardState.insufficient_material
+        bitboards = self.bitboards
+        # most positions have a pawn, rook or queen, which is enough to rule it out without counting anything
+        if (bitboards[PAWN] or bitboards[ROOK] or bitboards[QUEEN] or bitboards[PAWN + 6] or bitboards[ROOK + 6] or bitboards[QUEEN + 6]):
+            return False
+        piece_counts = [[bin(bitboards[code]).count('1') for code in range(team, team + 6)] for team in [0, 6]]
+        bishop_colors = [[bin(bitboards[BISHOP + team] & EVEN_SQUARES).count('1'), bin(bitboards[BISHOP + team] & ~EVEN_SQUARES).count('1')] for team in [0, 6]]
+        return insufficient_material(piece_counts, bishop_colors)
+
+    def num_pieces(self):
+        return bin(self.occupancy[0] | self.occupancy[1]).count('1')
+
+    def put_piece(self, code, sq):
+        bit = 1 << sq
+        self.bitboards[code] |= bit
+        self.occupancy[code // 6] |= bit
+        self.mailbox[sq] = code
+
+    def nnet_inputs(self, times_at_board, out = None): # see Board.nnet_inputs
+        if (out is None):
+            out = np.zeros([self.num_rows, self.num_cols, num_nnet_channels], np.float32)
+        else:
+            out[:] = 0
+
+        player_color = self.team_to_move
+        player_offset = 0 if player_color else 6
+
+        rows = []
+        cols = []
+        channels = []
+        for code in range(12):
+            channel = nnet_channels[code % 6] + (0 if (code - (code % 6)) == player_offset else 6)
+            for sq in squares_of(self.bitboards[code]):
+                rows.append((sq // 8) if player_color else 7 - (sq // 8)) # the board needs to be input oriented according to the player moving
+                cols.append(sq % 8)
+                channels.append(channel)
+        out[rows, cols, channels] = 1
+
+        player_castling = self.get_castling_rights(player_color)
+        enemy_castling = self.get_castling_rights(not player_color)
+        out[:, :, 12:] = [(0 if player_color else 1), self.total_moves, self.moves_since_advancement,
+                          (0 if player_castling[0] else 1), (0 if player_castling[1] else 1),
+                          (0 if enemy_castling[0] else 1), (0 if enemy_castling[1] else 1), times_at_board]
+
+        return out
+
+    def get_board_hash(self):
+        return self.board_hash
+
+    def calc_board_hash(self): # computes the hash from scratch, only needed when setting up a board or checking the running hash
+        ret_val = 0
+        for code in range(12):
+            for sq in squares_of(self.bitboards[code]):
+                ret_val ^= piece_keys[code][sq]
+
+        if (not self.team_to_move):
+            ret_val ^= zobrist_keys[0]
+        if (self.en_passant_col != -1):
+            ret_val ^= zobrist_keys[5 + self.en_passant_col]
+        ret_val ^= castling_keys[self.castling]
+        return ret_val
+
+    def check_board_hash(self, move, action):
+        full_hash = self.calc_board_hash()
+        if (full_hash != self.board_hash):
+            print('hash mismatch after ' + action + ' ' + str(move) + ': running ' + str(self.board_hash) + ' full ' + str(full_hash))
+            return False
+        return True
+
+    def make_piece(self, sq): # builds a Piece object for code outside of the engine (the GUI) that wants to look at pieces
+        code = self.mailbox[sq]
+        row, col = divmod(sq, 8)
+        return piece_classes[code % 6](row, col, code < 6, sq)
+
+    def get_piece_at(self, row, col):
+        if (0 <= row < 8 and 0 <= col < 8 and self.mailbox[(row * 8) + col] != EMPTY):
+            return self.make_piece((row * 8) + col)
+        return None
+
+    def get_pieces(self):
+        pieces = []
+        for sq in range(64):
+            if (self.mailbox[sq] != EMPTY):
+                pieces.append(self.make_piece(sq))
+        return pieces
+
+    def __str__(self):
+        board_representation = np.empty([8,8], dtype=object)
+
+        for piece in self.get_pieces():
+            board_representation[piece.row][piece.col] = str(piece)
+
+        return str(board_representation)
+
+    def do_str_move(self, str_move):
+        moves = self.get_moves_from_state()
+        for move in moves:
+            if (str_move == str(move)):
+                return self.do_move(move)
+        return None
+
+    def get_moves_from_state(self): # see Board.get_moves_from_state
+        if (self.legal_moves == None):
+            self.legal_moves = self.move_cache.get(self.board_hash)
+            if (self.legal_moves == None):
+                self.legal_moves = self.gen_legal_moves()
+                self.move_cache.put(self.board_hash, self.legal_moves)
+        return self.legal_moves
+
+    def is_square_attacked(self, sq, by_team, occ = None):
+        # tests if any piece of by_team attacks the square, given the occupancy occ which defaults to the board's
+        if (occ == None):
+            occ = self.occupancy[0] | self.occupancy[1]
+        them = 0 if by_team else 6
+        bitboards = self.bitboards
+        if (knight_attacks[sq] & bitboards[KNIGHT + them]):
+            return True
+        if (king_attacks[sq] & bitboards[KING + them]):
+            return True
+        if (pawn_attacks[1 if by_team else 0][sq] & bitboards[PAWN + them]): # a square is attacked by the pawns that it would attack as a pawn of the other team
+            return True
+        queens = bitboards[QUEEN + them]
+        if (rook_attacks(sq, occ) & (bitboards[ROOK + them] | queens)):
+            return True
+        if (bishop_attacks(sq, occ) & (bitboards[BISHOP + them] | queens)):
+            return True
+        return False
+
+    def attackers_to(self, sq, by_team, occ):
+        them = 0 if by_team else 6
+        bitboards = self.bitboards
+        queens = bitboards[QUEEN + them]
+        return ((knight_attacks[sq] & bitboards[KNIGHT + them])
+                | (king_attacks[sq] & bitboards[KING + them])
+                | (pawn_attacks[1 if by_team else 0][sq] & bitboards[PAWN + them])
+                | (rook_attacks(sq, occ) & (bitboards[ROOK + them] | queens))
+                | (bishop_attacks(sq, occ) & (bitboards[BISHOP + them] | queens)))
+
+    def team_in_check(self, team):
+        king_bb = self.bitboards[KING + (0 if team else 6)]
+        if (not king_bb):
+            return False
+        king_sq = king_bb.bit_length() - 1
+        return self.is_square_attacked(king_sq, not team, self.occupancy[0] | self.occupancy[1])
+
+    def get_castling_rights(self, team):
+        if (team):
+            return (bool(self.castling & WHITE_QS), bool(self.castling & WHITE_KS))
+        else:
+            return (bool(self.castling & BLACK_QS), bool(self.castling & BLACK_KS))
+
+    def gen_legal_moves(self):
+        # instead of trying out every move, the pieces pinned to the king and the pieces giving check are found once,
+        # and they restrict the squares each piece is allowed to move to
+        moves = []
+        team = self.team_to_move
+        us = 0 if team else 6
+        them = 6 - us
+        bitboards = self.bitboards
+        mailbox = self.mailbox
+        own = self.occupancy[0 if team else 1]
+        enemy = self.occupancy[1 if team else 0]
+        occ = own | enemy
+
+        king_sq = bitboards[KING + us].bit_length() - 1
+        checkers = self.attackers_to(king_sq, not team, occ)
+
+        # king moves are tested by looking for attackers with the king taken off the board, so he can't hide behind himself
+        occ_without_king = occ ^ (1 << king_sq)
+        for to_sq in squares_of(king_attacks[king_sq] & ~own):
+            if (not self.is_square_attacked(to_sq, not team, occ_without_king)):
+                moves.append(self.make_move(king_sq, to_sq, "King"))
+
+        if (checkers & (checkers - 1)): # in double check only the king can move
+            return moves
+
+        if (checkers):
+            checker_sq = checkers.bit_length() - 1
+            target_mask = between[king_sq][checker_sq] | checkers
+        else:
+            target_mask = FULL
+            self.gen_castling_moves(moves, team, king_sq, occ)
+
+        # finds the pieces pinned to the king, along with the line each is allowed to move along
+        pin_lines = {}
+        queens = bitboards[QUEEN + them]
+        snipers = ((rook_attacks(king_sq, enemy) & (bitboards[ROOK + them] | queens))
+                   | (bishop_attacks(king_sq, enemy) & (bitboards[BISHOP + them] | queens)))
+        for sniper_sq in squares_of(snipers):
+            blockers = between[king_sq][sniper_sq] & occ
+            if (blockers and not (blockers & (blockers - 1)) and (blockers & own)):
+                pin_lines[blockers.bit_length() - 1] = between[king_sq][sniper_sq] | (1 << sniper_sq)
+
+        # knights
+        for from_sq in squares_of(bitboards[KNIGHT + us]):
+            if (from_sq not in pin_lines): # a pinned knight can never move
+                for to_sq in squares_of(knight_attacks[from_sq] & ~own & target_mask):
+                    moves.append(self.make_move(from_sq, to_sq, "Knight"))
+
+        # sliding pieces
+        for piece_type, name, attack_fn in ((BISHOP, "Bishop", bishop_attacks), (ROOK, "Rook", rook_attacks), (QUEEN, "Queen", rook_attacks)):
+            for from_sq in squares_of(bitboards[piece_type + us]):
+                targets = attack_fn(from_sq, occ)
+                if (piece_type == QUEEN):
+                    targets |= bishop_attacks(from_sq, occ)
+                targets &= ~own & target_mask
+                if (from_sq in pin_lines):
+                    targets &= pin_lines[from_sq]
+                for to_sq in squares_of(targets):
+                    moves.append(self.make_move(from_sq, to_sq, name))
+
+        # pawns
+        direction = 8 if team else -8
+        promotion_row = 7 if team else 0
+        double_push_row = 1 if team else 6
+        ep_sq = -1
+        if (self.ep_capture_is_possible()):
+            ep_sq = ((5 if team else 2) * 8) + self.en_passant_col
+        for from_sq in squares_of(bitboards[PAWN + us]):
+            allowed = target_mask
+            if (from_sq in pin_lines):
+                allowed &= pin_lines[from_sq]
+            to_sq = from_sq + direction
+            if (mailbox[to_sq] == EMPTY):
+                if ((1 << to_sq) & allowed):
+                    self.add_pawn_moves(moves, from_sq, to_sq, promotion_row)
+                if (from_sq // 8 == double_push_row):
+                    to_sq += direction
+                    if (mailbox[to_sq] == EMPTY and (1 << to_sq) & allowed):
+                        moves.append(self.make_move(from_sq, to_sq, "Pawn"))
+            for to_sq in squares_of(pawn_attacks[0 if team else 1][from_sq] & enemy & allowed):
+                self.add_pawn_moves(moves, from_sq, to_sq, promotion_row)
+            if (ep_sq != -1 and (pawn_attacks[0 if team else 1][from_sq] >> ep_sq) & 1):
+                # en passant removes two pieces from a row at once, so it is simplest to just look for attacks on the king afterwards
+                capture_sq = ep_sq - direction
+                ep_occ = occ ^ (1 << from_sq) ^ (1 << ep_sq) ^ (1 << capture_sq)
+                bitboards[PAWN + them] ^= 1 << capture_sq
+                if (not self.is_square_attacked(king_sq, not team, ep_occ)):
+                    move = Move(from_sq // 8, from_sq % 8, ep_sq // 8, ep_sq % 8, "Pawn", is_capture = True, capture_name = "Pawn", is_ep = True)
+                    moves.append(move)
+                bitboards[PAWN + them] ^= 1 << capture_sq
+
+        return moves
+
+    def resolve_move(self, start_sq, end_sq, promotion = None): # see Board.resolve_move
+        code = self.mailbox[start_sq]
+        team = self.team_to_move
+        if (code == EMPTY or (code < 6) != team):
+            return None
+        us = 0 if team else 6
+        own = self.occupancy[0 if team else 1]
+        enemy = self.occupancy[1 if team else 0]
+        occ = own | enemy
+        end_bit = 1 << end_sq
+
+        # the pseudo legal moves of the piece that end on end_sq
+        moves = []
+        piece_type = code - us
+        if (piece_type == PAWN):
+            direction = 8 if team else -8
+            promotion_row = 7 if team else 0
+            push_sq = start_sq + direction
+            if (end_sq == push_sq and not (occ & end_bit)):
+                self.add_pawn_moves(moves, start_sq, end_sq, promotion_row)
+            elif (end_sq == push_sq + direction and start_sq // 8 == (1 if team else 6) and not (occ & ((1 << push_sq) | end_bit))):
+                moves.append(self.make_move(start_sq, end_sq, "Pawn"))
+            elif (pawn_attacks[0 if team else 1][start_sq] & end_bit):
+                if (enemy & end_bit):
+                    self.add_pawn_moves(moves, start_sq, end_sq, promotion_row)
+                elif (self.ep_capture_is_possible() and end_sq == ((5 if team else 2) * 8) + self.en_passant_col):
+                    moves.append(Move(start_sq // 8, start_sq % 8, end_sq // 8, end_sq % 8, "Pawn", is_capture = True, capture_name = "Pawn", is_ep = True))
+        elif (piece_type == KING):
+            if (king_attacks[start_sq] & end_bit & ~own):
+                moves.append(self.make_move(start_sq, end_sq, "King"))
+            elif (not self.is_square_attacked(start_sq, not team, occ)):
+                self.gen_castling_moves(moves, team, start_sq, occ)
+        else:
+            if (piece_type == KNIGHT):
+                targets = knight_attacks[start_sq]
+            else:
+                targets = 0
+                if (piece_type != BISHOP):
+                    targets |= rook_attacks(start_sq, occ)
+                if (piece_type != ROOK):
+                    targets |= bishop_attacks(start_sq, occ)
+            if (targets & end_bit & ~own):
+                moves.append(self.make_move(start_sq, end_sq, piece_names[piece_type]))
+
+        for move in moves:
+            if ((move.end_row * 8) + move.end_col != end_sq):
+                continue
+            if ((move.piece_name != (promotion if promotion != None else "Queen")) if move.is_promotion else (promotion != None)):
+                continue
+            # one pseudo legal move is cheapest to test by playing it and looking for attacks on the king
+            undo_info = self.do_move(move, is_test = True)
+            in_check = self.team_in_check(team)
+            self.undo_move(*undo_info, is_test = True)
+            return None if in_check else move
+        return None
+
+    def ep_capture_is_possible(self): # whether the en passant column has an enemy pawn to take and an empty square to land on, see Board.gen_en_passant_moves
+        if (self.en_passant_col == -1):
+            return False
+        team = self.team_to_move
+        capture_sq = ((4 if team else 3) * 8) + self.en_passant_col
+        return self.mailbox[capture_sq] == PAWN + (6 if team else 0) and self.mailbox[capture_sq + (8 if team else -8)] == EMPTY
+
+    def make_move(self, from_sq, to_sq, name):
+        code = self.mailbox[to_sq]
+        if (code == EMPTY):
+            return Move(from_sq // 8, from_sq % 8, to_sq // 8, to_sq % 8, name)
+        return Move(from_sq // 8, from_sq % 8, to_sq // 8, to_sq % 8, name, is_capture = True, capture_name = piece_names[code % 6])
+
+    def add_pawn_moves(self, moves, from_sq, to_sq, promotion_row):
+        if (to_sq // 8 == promotion_row):
+            code = self.mailbox[to_sq]
+            is_capture = (code != EMPTY)
+            capture_name = piece_names[code % 6] if is_capture else None
+            for piece_name in Pieces.promotion_names:
+                moves.append(Move(from_sq // 8, from_sq % 8, to_sq // 8, to_sq % 8, piece_name, is_capture = is_capture, capture_name = capture_name, is_promotion = True))
+        else:
+            moves.append(self.make_move(from_sq, to_sq, "Pawn"))
+
+    def gen_castling_moves(self, moves, team, king_sq, occ):
+        # only called when the king is not in check, the king can't pass through or land on an attacked square
+        if (team):
+            qs_right, ks_right = WHITE_QS, WHITE_KS
+        else:
+            qs_right, ks_right = BLACK_QS, BLACK_KS
+        row = king_sq // 8
+        if (self.castling & qs_right and not (occ & (0b1110 << (row * 8)))):
+            if (not self.is_square_attacked(king_sq - 1, not team, occ) and not self.is_square_attacked(king_sq - 2, not team, occ)):
+                moves.append(Move(row, 4, row, 2, "King", is_qs_castle = True))
+        if (self.castling & ks_right and not (occ & (0b1100000 << (row * 8)))):
+            if (not self.is_square_attacked(king_sq + 1, not team, occ) and not self.is_square_attacked(king_sq + 2, not team, occ)):
+                moves.append(Move(row, 4, row, 6, "King", is_ks_castle = True))
+
+    def move_bits(self, code, from_sq, to_sq):
+        from_to = (1 << from_sq) | (1 << to_sq)
+        self.bitboards[code] ^= from_to
+        self.occupancy[code // 6] ^= from_to
+        self.mailbox[from_sq] = EMPTY
+        self.mailbox[to_sq] = code
+        return piece_keys[code][from_sq] ^ piece_keys[code][to_sq]
+
+    def do_move(self, move, is_test = False):
+        ep_col = self.en_passant_col
+        castling_rights = self.castling
+        moves_since_advancement = self.moves_since_advancement
+        board_hash = self.board_hash
+        new_hash = board_hash ^ zobrist_keys[0]
+        if (ep_col != -1):
+            new_hash ^= zobrist_keys[5 + ep_col]
+
+        start_sq = (move.start_row * 8) + move.start_col
+        end_sq = (move.end_row * 8) + move.end_col
+        code = self.mailbox[start_sq]
+
+        # remove the piece that was captured if applicable
+        if (move.is_capture):
+            if (move.is_ep): # with en passant, the piece that is captured is not on the tile that is moved to
+                capture_sq = (move.start_row * 8) + move.end_col
+            else:
+                capture_sq = end_sq
+            capture_code = self.mailbox[capture_sq]
+            self.bitboards[capture_code] ^= 1 << capture_sq
+            self.occupancy[capture_code // 6] ^= 1 << capture_sq
+            self.mailbox[capture_sq] = EMPTY
+            new_hash ^= piece_keys[capture_code][capture_sq]
+
+        new_hash ^= self.move_bits(code, start_sq, end_sq)
+        if (move.is_promotion):
+            promotion_code = piece_types[move.piece_name] + (code - PAWN)
+            self.bitboards[code] ^= 1 << end_sq
+            self.bitboards[promotion_code] ^= 1 << end_sq
+            self.mailbox[end_sq] = promotion_code
+            new_hash ^= piece_keys[code][end_sq] ^ piece_keys[promotion_code][end_sq]
+        elif (move.is_qs_castle):
+            new_hash ^= self.move_bits(code - KING + ROOK, start_sq - 4, start_sq - 1)
+        elif (move.is_ks_castle):
+            new_hash ^= self.move_bits(code - KING + ROOK, start_sq + 3, start_sq + 1)
+
+        self.castling &= castling_masks[start_sq] & castling_masks[end_sq]
+        new_hash ^= castling_keys[castling_rights ^ self.castling]
+
+        # update en passant information
+        self.en_passant_col = -1 # en passant capture is only available for one ply
+        if (code % 6 == PAWN and abs(move.start_row - move.end_row) == 2):
+            self.en_passant_col = move.start_col
+            new_hash ^= zobrist_keys[5 + move.start_col]
+        self.board_hash = new_hash
+
+        # swaps the team to move
+        self.team_to_move = not self.team_to_move
+
+        if (not is_test):
+            self.total_moves += 1
+            # updates information for the 50 move rule
+            if (not(move.is_capture or code % 6 == PAWN)):
+                self.moves_since_advancement += 1
+            else:
+                self.moves_since_advancement = 0
+
+            if (self.debug_hash):
+                self.check_board_hash(move, 'move')
+
+            # the legal moves for the next player are generated when they are needed
+            self.legal_moves = None
+
+        return move, ep_col, castling_rights, moves_since_advancement, board_hash
+
+    def undo_move(self, move, ep_col, castling_rights, moves_since_advancement, board_hash = None, is_test = False):
+        # castling_rights is the full set of castling flags returned by do_move, not just those of the team that moved
+        self.team_to_move = not self.team_to_move
+
+        if (not is_test):
+            self.total_moves -= 1
+            self.moves_since_advancement = moves_since_advancement
+
+        self.en_passant_col = ep_col
+        self.castling = castling_rights
+        if (board_hash != None):
+            self.board_hash = board_hash
+
+        start_sq = (move.start_row * 8) + move.start_col
+        end_sq = (move.end_row * 8) + move.end_col
+        us = 0 if self.team_to_move else 6
+
+        if (move.is_promotion):
+            promotion_code = self.mailbox[end_sq]
+            self.bitboards[promotion_code] ^= 1 << end_sq
+            self.bitboards[PAWN + us] ^= 1 << end_sq
+            self.mailbox[end_sq] = PAWN + us
+        elif (move.is_qs_castle):
+            self.move_bits(ROOK + us, start_sq - 1, start_sq - 4)
+        elif (move.is_ks_castle):
+            self.move_bits(ROOK + us, start_sq + 1, start_sq + 3)
+        self.move_bits(self.mailbox[end_sq], end_sq, start_sq)
+
+        # then adds back the piece that was captured if applicable
+        if (move.is_capture):
+            if (move.is_ep):
+                capture_sq = (move.start_row * 8) + move.end_col
+            else:
+                capture_sq = end_sq
+            self.put_piece(piece_types[move.capture_name] + (6 - us), capture_sq)
+
+        if (not is_test):
+            if (self.debug_hash):
+                self.check_board_hash(move, 'undo')
+            self.legal_moves = None
@@ -1,15 +1,23 @@
 import numpy as np
-import secrets
+import random
 import Pieces
+from Pieces import move_squares
+from Move import Move
+from Fen import parse_fen, make_fen
+from MoveCache import MoveCache
+from Snapshot import Snapshot, bitboards_from_mailbox
+from AttackTables import knight_targets, king_targets, pawn_targets, pawn_attacks, ray_squares, is_rook_direction
 
 
 # set up the zobrist hashing
-def random_num():
-    return secrets.randbits(32)
+# the keys are 64 bits so collisions stay unlikely across the hundreds of thousands of positions in a search tree, and they come
+# from a fixed seed so every process and every run hashes a position the same way, which lets hashes be saved and shared
+zobrist_seed = 20200916
+zobrist_random = random.Random(zobrist_seed)
 
 zobrist_keys = []
 for i in range(781):
-    zobrist_keys.append(random_num())
+    zobrist_keys.append(zobrist_random.getrandbits(64))
 
 # Index meanings of zobrist keys
 # 0 is the hash for who is moving
@@ -18,10 +26,60 @@ for i in range(781):
 # 5 through 12 inclusive are for the column in which en passant is available, if applicable
 # 13 through 780 inclusive are for each piece at each square (12 distinct pieces * 64 squares = 768)
 
+zobrist_piece_indices = {"Pawn": 0, "Knight": 1, "Bishop": 2, "Rook": 3, "Queen": 4, "King": 5}
+
+def zobrist_piece_key(name, team, row, col):
+    index = 13 + (zobrist_piece_indices[name] * 64) + ((row * 8) + col)
+    if (not team):
+        index += 384 # 6 x 64, 6 pieces, 64 squares
+    return zobrist_keys[index]
+
+# castling rights are also packed into 4 bit flags: 1 is white queenside, 2 white kingside, 4 black queenside and 8 black kingside
+# castling_keys[flags] is the xor of the keys for every right in flags, so a change in rights is a single xor
+castling_keys = []
+for flags in range(16):
+    key = 0
+    for i in range(4):
+        if (flags & (1 << i)):
+            key ^= zobrist_keys[1 + i]
+    castling_keys.append(key)
+
+# anding the castling flags with these masks for both squares of a move removes any rights that the move loses,
+# by moving the king or a rook or by capturing a rook on its starting square
+castling_masks = [15] * 64
+castling_masks[0] = 15 & ~1
+castling_masks[7] = 15 & ~2
+castling_masks[4] = 15 & ~(1 | 2)
+castling_masks[56] = 15 & ~4
+castling_masks[63] = 15 & ~8
+castling_masks[60] = 15 & ~(4 | 8)
+
+# the nnet input planes of each piece type for the player moving, the enemy's are 6 higher, followed by 8 constant planes
+num_nnet_channels = 20
+nnet_piece_channels = {"Pawn": 0, "Rook": 1, "Bishop": 2, "Knight": 3, "Queen": 4, "King": 5}
+
+piece_names = ["Pawn", "Knight", "Bishop", "Rook", "Queen", "King"] # in zobrist index order, which is also the piece code order of snapshots
+piece_classes = {"Pawn": Pieces.Pawn, "Knight": Pieces.Knight, "Bishop": Pieces.Bishop, "Rook": Pieces.Rook, "Queen": Pieces.Queen, "King": Pieces.King}
+
+def insufficient_material(piece_counts, bishop_colors):
+    # piece_counts[team][type] is the number of pieces of each type (in zobrist index order) for white (index 0) and black (index 1),
+    # and bishop_colors[team][(row + col) % 2] the number of each team's bishops on each color of square. the drawn endings are
+    # king vs king, king and bishop vs king, king and knight vs king, and king and bishop vs king and same color bishop
+    for counts in piece_counts:
+        if (counts[0] > 0 or counts[3] > 0 or counts[4] > 0 or counts[2] > 1): # any pawn, rook or queen, or two bishops
+            return False
+    knight_count = piece_counts[0][1] + piece_counts[1][1]
+    bishop_count = piece_counts[0][2] + piece_counts[1][2]
+    if (knight_count > 1 or (knight_count > 0 and bishop_count > 0)):
+        return False
+    if (bishop_count == 2): # one each, which only draws if they are on the same color
+        return bishop_colors[0][0] == bishop_colors[1][0]
+    return True
 
 
 class Board:
-    def __init__(self):
+    def __init__(self, debug_hash = False, fen = None, snapshot = None, track_attacks = False, debug_attacks = False):
+        # fen or snapshot optionally give a position to start from instead of the initial one
         self.pieces = []
         self.kings = [] # kings are stored apart from the other pieces
                         # so we can easily test if they are in check
@@ -32,12 +90,42 @@ class Board:
         self.num_cols = 8
         self.en_passant_col = -1
 
+        # squares is a mailbox of the board, index (row * 8) + col holds the living piece on that square or None
+        # it is kept in sync by do_move, undo_move and swap_piece so lookups never have to scan the piece lists
+        self.squares = [None] * (self.num_rows * self.num_cols)
+        self.id_to_piece = {} # piece_id -> piece object
+        # watchers[sq] is the set of living pieces whose moves depend on square sq (the bits of their dependent_squares),
+        # so after a move only the pieces watching the squares it changes are regenerated
+        self.watchers = [set() for sq in range(self.num_rows * self.num_cols)]
+        # the number of living pieces of each type for each team, and of bishops on each color of square, see insufficient_material
+        self.piece_counts = [[0] * 6, [0] * 6]
+        self.bishop_colors = [[0, 0], [0, 0]]
+        self.captured_pieces = [] # the pieces captured by the moves made so far, in order, so undo knows which piece to revive
+                                  # (a move can be reused in a transposition where a different piece of the same kind is captured)
+
+        self.legal_moves = None # None until the legal moves of the current position are asked for
+        self.move_cache = MoveCache()
+
         self.team_to_move = True
 
         self.moves_since_advancement = 0 # used to determine if the game is drawn'
         self.total_moves = 0
 
-        self.reset_board()
+        # the board hash is updated with a few xors on every move instead of being recomputed,
+        # debug_hash checks it against the full recomputation after every move and undo
+        self.debug_hash = debug_hash
+
+        # track_attacks keeps attack_counts[team][sq], the number of each team's pieces attacking every square (index 0 is white),
+        # up to date as the pieces regenerate, so is_attacked is a lookup instead of walking rays out from the square.
+        # debug_attacks checks every count against is_square_attacked after every move and undo, and every is_attacked answer
+        self.track_attacks = track_attacks or debug_attacks
+        self.debug_attacks = debug_attacks
+        self.attack_counts = [[0] * 64, [0] * 64]
+
+        if (snapshot != None):
+            self.restore(snapshot)
+        elif (fen == None or not self.set_fen(fen)):
+            self.reset_board()
 
     def reset_board(self):
         main_rows = [0, 7]
@@ -71,204 +159,261 @@ class Board:
             for col in range(8):
                 self.pieces.append(Pieces.Pawn(pawn_row, col, team, piece_id_counter))
                 piece_id_counter += 1
+
+        for piece in self.pieces:
+            self.place_piece(piece)
+        for king in self.kings:
+            self.place_piece(king)
             
         for piece in self.pieces:
-            piece = piece.gen_moves(self, None)
+            self.gen_piece_moves(piece, None)
         for king in self.kings:
-            king = king.gen_moves(self, None)
+            self.gen_piece_moves(king, None)
 
-        self.gen_legal_moves()
+        self.board_hash = self.calc_board_hash()
+        self.legal_moves = None
 
-    def nnet_inputs(self, times_at_board):
-        num_channels = 20
-        
-        inputs = np.zeros([self.num_rows, self.num_cols, num_channels], np.dtype(float))
+    def set_fen(self, fen): # replaces the position with the one in the fen string, returns False and leaves the board alone if it can't be read
+        position = parse_fen(fen)
+        if (position == None):
+            return False
+        placement, self.team_to_move, castling_flags, self.en_passant_col, self.moves_since_advancement, self.total_moves = position
+        self.set_pieces(placement, castling_flags)
+
+        self.board_hash = self.calc_board_hash()
+        self.legal_moves = None
+        return True
+
+    def set_pieces(self, placement, castling_flags): # replaces every piece with the (name, team, row, col) in placement
+        self.pieces = []
+        self.kings = [None, None]
+        self.squares = [None] * (self.num_rows * self.num_cols)
+        self.id_to_piece = {}
+        self.watchers = [set() for sq in range(self.num_rows * self.num_cols)]
+        self.attack_counts = [[0] * 64, [0] * 64]
+        self.piece_counts = [[0] * 6, [0] * 6]
+        self.bishop_colors = [[0, 0], [0, 0]]
+        self.captured_pieces = []
+        for piece_id in range(len(placement)):
+            name, team, row, col = placement[piece_id]
+            piece = piece_classes[name](row, col, team, piece_id)
+            if (name == "King"):
+                self.kings[0 if team else 1] = piece
+            else:
+                self.pieces.append(piece)
+            self.place_piece(piece)
+        self.set_castling_flags(castling_flags)
+
+        for piece in self.get_pieces():
+            self.gen_piece_moves(piece, None)
+
+    def snapshot(self): # an immutable copy of the position, see Snapshot
+        mailbox = tuple(-1 if piece == None else zobrist_piece_indices[piece.name] + (0 if piece.team else 6) for piece in self.squares)
+        return Snapshot(mailbox, bitboards_from_mailbox(mailbox), self.team_to_move, self.get_castling_flags(), self.en_passant_col,
+                        self.moves_since_advancement, self.total_moves, self.board_hash)
+
+    def restore(self, snapshot): # sets the board to the snapshot's position, moves made before it can no longer be undone
+        placement = []
+        for sq in range(64):
+            code = snapshot.mailbox[sq]
+            if (code != -1):
+                placement.append((piece_names[code % 6], code < 6, sq // 8, sq % 8))
+        self.team_to_move = snapshot.team_to_move
+        self.en_passant_col = snapshot.en_passant_col
+        self.moves_since_advancement = snapshot.moves_since_advancement
+        self.total_moves = snapshot.total_moves
+        self.set_pieces(placement, snapshot.castling_flags)
+
+        self.board_hash = snapshot.board_hash
+        if (self.debug_hash):
+            self.check_board_hash(None, 'restore')
+        self.legal_moves = None
+
+    @classmethod
+    def from_snapshot(cls, snapshot, debug_hash = False, track_attacks = False, debug_attacks = False):
+        return cls(debug_hash, snapshot = snapshot, track_attacks = track_attacks, debug_attacks = debug_attacks)
+
+    def clone(self): # a separate board in the same position, which can be searched without touching this one
+        return self.from_snapshot(self.snapshot(), self.debug_hash, self.track_attacks, self.debug_attacks)
+
+    def get_fen(self):
+        squares = [None if piece == None else (piece.name, piece.team) for piece in self.squares]
+        return make_fen(squares, self.team_to_move, self.get_castling_flags(), self.en_passant_col, self.moves_since_advancement, self.total_moves)
+
+    def nnet_inputs(self, times_at_board, out = None):
+        # out can be a slot of a larger array (for example batch[i]) that the inputs are written into instead of a new array,
+        # so a batch of positions can be filled without any copies
+        if (out is None):
+            out = np.zeros([self.num_rows, self.num_cols, num_nnet_channels], np.float32)
+        else:
+            out[:] = 0
 
         player_color = self.team_to_move
-        player_num = (0 if player_color else 1)
-        total_moves = self.total_moves
-        moves_since_advancement = self.moves_since_advancement
 
+        # piece planes, with 6 being added to the channel if the piece is on the enemy team
+        rows = []
+        cols = []
+        channels = []
+        for piece in self.get_pieces():
+            rows.append(piece.row if player_color else 7 - piece.row) # the board needs to be input oriented according to the player moving
+            cols.append(piece.col)
+            channels.append(nnet_piece_channels[piece.name] + (0 if (player_color == piece.team) else 6))
+        out[rows, cols, channels] = 1
+
+        # the last 8 planes are constant: the player's color, total moves, moves since advancement, castling rights for both teams
+        # and the number of times the board has been seen
         player_castling = self.get_castling_rights(player_color)
-        player_castle_nums = [(0 if player_castling[0] else 1), (0 if player_castling[1] else 1)]
         enemy_castling = self.get_castling_rights(not player_color)
-        enemy_castle_nums = [(0 if enemy_castling[0] else 1), (0 if enemy_castling[1] else 1)]
+        out[:, :, 12:] = [(0 if player_color else 1), self.total_moves, self.moves_since_advancement,
+                          (0 if player_castling[0] else 1), (0 if player_castling[1] else 1),
+                          (0 if enemy_castling[0] else 1), (0 if enemy_castling[1] else 1), times_at_board]
 
-        # the following are the channel numbers of each piece type, with 6 being added if the piece is on the enemy team
-        pawn_num = 0
-        rook_num = 1
-        bishop_num = 2
-        knight_num = 3
-        queen_num = 4
-        king_num = 5
-
-        all_pieces = []
-        for piece in self.pieces:
-            if (piece.alive):
-                all_pieces.append(piece)
-        for king in self.kings:
-            if (king.alive):
-                all_pieces.append(king)
-        
-        for piece in all_pieces:
-            if (player_color):
-                row = piece.row
-                col = piece.col
-            else:
-                row = 7 - piece.row # the board needs to be input oriented according to the player moving
-                col = piece.col
-            modifier = 0 if (player_color == piece.team) else 6
-            if (piece.name == "Pawn"):
-                inputs[row][col][pawn_num + modifier] = 1
-            elif (piece.name == "Rook"):
-                inputs[row][col][rook_num + modifier] = 1
-            elif (piece.name == "Bishop"):
-                inputs[row][col][bishop_num + modifier] = 1
-            elif (piece.name == "Knight"):
-                inputs[row][col][knight_num + modifier] = 1
-            elif (piece.name == "Queen"):
-                inputs[row][col][queen_num + modifier] = 1
-            elif (piece.name == "King"):
-                inputs[row][col][king_num + modifier] = 1
-
-        # TODO: add 6 more layers composed of the player's color, total moves, move since advancement, and castling rights for both teams
-        for row in range(self.num_rows):
-            for col in range(self.num_cols):
-                inputs[row][col][12] = player_num
-                inputs[row][col][13] = total_moves
-                inputs[row][col][14] = moves_since_advancement
-                inputs[row][col][15] = player_castle_nums[0]
-                inputs[row][col][16] = player_castle_nums[1]
-                inputs[row][col][17] = enemy_castle_nums[0]
-                inputs[row][col][18] = enemy_castle_nums[1]
-                inputs[row][col][19] = times_at_board
-
-        return inputs        
+        return out
 
     def get_board_hash(self):
-        ret_val = None
-        for piece in self.pieces:
-            if (piece.alive):
-                index = self.get_piece_zobrist_index(piece)
-                val = zobrist_keys[index]
-                if (ret_val == None):
-                    ret_val = val
-                else:
-                    ret_val = ret_val ^ val
-        for piece in self.kings:
-            if (piece.alive):
-                index = self.get_piece_zobrist_index(piece)
-                val = zobrist_keys[index]
-                if (ret_val == None):
-                    ret_val = val
-                else:
-                    ret_val = ret_val ^ val
+        return self.board_hash
+
+    def calc_board_hash(self): # computes the hash from scratch, only needed when setting up a board or checking the running hash
+        ret_val = 0
+        for piece in self.get_pieces():
+            ret_val ^= zobrist_piece_key(piece.name, piece.team, piece.row, piece.col)
 
         if (not self.team_to_move):
-            ret_val = ret_val ^ zobrist_keys[0]
-            
-        white_castling = self.get_castling_rights(True)
-        black_castling = self.get_castling_rights(False)
-        
+            ret_val ^= zobrist_keys[0]
         if (self.en_passant_col != -1):
-            ret_val = ret_val ^ zobrist_keys[5 + self.en_passant_col]
-
-        if (white_castling[0]):
-            ret_val = ret_val ^ zobrist_keys[1]
-        if (white_castling[1]):
-            ret_val = ret_val ^ zobrist_keys[2]
-        if (black_castling[0]):
-            ret_val = ret_val ^ zobrist_keys[3]
-        if (black_castling[1]):
-            ret_val = ret_val ^ zobrist_keys[4]
-            
+            ret_val ^= zobrist_keys[5 + self.en_passant_col]
+        ret_val ^= castling_keys[self.get_castling_flags()]
+
         return ret_val
 
-    def get_piece_zobrist_index(self, piece):
-        if (piece.name == "Pawn"):
-            index = 0
-        elif (piece.name == "Knight"):
-            index = 1
-        elif (piece.name == "Bishop"):
-            index = 2
-        elif (piece.name == "Rook"):
-            index = 3
-        elif (piece.name == "Queen"):
-            index = 4
-        elif (piece.name == "King"):
-            index = 5
-        index *= 64
-        if (not piece.team):
-            index += 384 # 6 x 64, 6 pieces, 64 squares
-        index += ((piece.row * 8) + piece.col)
-        return index
+    def check_board_hash(self, move, action):
+        full_hash = self.calc_board_hash()
+        if (full_hash != self.board_hash):
+            print('hash mismatch after ' + action + ' ' + str(move) + ': running ' + str(self.board_hash) + ' full ' + str(full_hash))
+            return False
+        return True
         
 
+    def place_piece(self, piece):
+        self.squares[(piece.row * 8) + piece.col] = piece
+        self.id_to_piece[piece.piece_id] = piece
+        self.count_piece(piece, 1)
+
+    def gen_piece_moves(self, piece, latest_move, is_undo = False): # regenerates a piece's moves and moves it in watchers to its new dependencies
+        old_squares = piece.dependent_squares
+        piece.gen_moves(self, latest_move, is_undo)
+        self.update_watchers(piece, old_squares, piece.dependent_squares)
+        if (self.track_attacks):
+            self.update_attack_counts(piece, self.attack_mask(piece))
+
+    def update_watchers(self, piece, old_squares, new_squares):
+        changed = old_squares ^ new_squares # most of a regenerated piece's squares stay the same, so only the changes are visited
+        while (changed):
+            bit = changed & -changed
+            if (new_squares & bit):
+                self.watchers[bit.bit_length() - 1].add(piece)
+            else:
+                self.watchers[bit.bit_length() - 1].discard(piece)
+            changed ^= bit
+
+    def attack_mask(self, piece): # the squares a piece attacks, which is what it depends on apart from its own square, except for pawns
+        sq = (piece.row * 8) + piece.col
+        if (piece.name == "Pawn"):
+            return pawn_attacks[0 if piece.team else 1][sq]
+        return piece.dependent_squares & ~(1 << sq)
+
+    def update_attack_counts(self, piece, new_attacks): # moves the piece's contribution to the attack counts from its old squares to new_attacks
+        counts = self.attack_counts[0 if piece.team else 1]
+        changed = piece.attacked_squares ^ new_attacks
+        while (changed):
+            bit = changed & -changed
+            counts[bit.bit_length() - 1] += 1 if (new_attacks & bit) else -1
+            changed ^= bit
+        piece.attacked_squares = new_attacks
+
+    def check_attack_counts(self, move, action):
+        for team_index in range(2):
+            for sq in range(64):
+                if ((self.attack_counts[team_index][sq] > 0) != self.is_square_attacked(sq, team_index == 0)):
+                    print('attack count mismatch after ' + action + ' ' + str(move) + ' on square ' + str(sq) + ' for team ' + str(team_index))
+                    return False
+        return True
+
+    def pieces_to_update(self, move, move_piece):
+        # the pieces other than move_piece that need to be regenerated after move is made or undone
+        pieces = set()
+        squares = move_squares(move) # every piece watching a square the move changes
+        while (squares):
+            bit = squares & -squares
+            pieces |= self.watchers[bit.bit_length() - 1]
+            squares ^= bit
+        pieces.discard(move_piece)
+        return pieces
+
+    def count_piece(self, piece, amount): # adds amount to the counts of the piece's type and, for bishops, square color
+        team_index = 0 if piece.team else 1
+        self.piece_counts[team_index][zobrist_piece_indices[piece.name]] += amount
+        if (piece.name == "Bishop"):
+            self.bishop_colors[team_index][(piece.row + piece.col) % 2] += amount
+
+    def insufficient_material(self):
+        return insufficient_material(self.piece_counts, self.bishop_colors)
+
+    def num_pieces(self):
+        return sum(self.piece_counts[0]) + sum(self.piece_counts[1])
+
     def get_piece_at(self, row, col):
-        ret_piece = None # if it doesn't find a piece at the position it returns None
-        for piece in self.pieces:
-            if (piece.alive and piece.row == row and piece.col == col):
-                return piece
-        for king in self.kings:
-            if (king.alive and king.row == row and king.col == col):
-                return king
-        
-        return ret_piece
+        if (0 <= row < self.num_rows and 0 <= col < self.num_cols):
+            return self.squares[(row * 8) + col]
+        return None # if it doesn't find a piece at the position it returns None
 
     def kill_piece_at(self, row, col):
-        for piece in self.pieces:
-            if (piece.alive and piece.row == row and piece.col == col):
-                piece.alive = False
-                return True
-        for king in self.kings:
-            if (king.alive and king.row == row and king.col == col):
-                king.alive = False # this probably shouldn't be happening
-                return True
+        piece = self.get_piece_at(row, col)
+        if (piece != None):
+            piece.alive = False
+            self.squares[(row * 8) + col] = None
+            self.update_watchers(piece, piece.dependent_squares, 0)
+            if (self.track_attacks):
+                self.update_attack_counts(piece, 0)
+            self.count_piece(piece, -1)
+            return True
 
         print('failed to kill piece')
         return False
 
     def revive_piece_at(self, row, col, team, piece_id): # this is more of a revival than an addition
-        for piece in self.pieces:
-            if (not piece.alive and piece.row == row and piece.col == col and piece.piece_id == piece_id):
-                piece.alive = True
-                piece.dependent_on_square[row][col] = True
-                return True
-        for king in self.kings:
-            if (not king.alive and king.row == row and king.col == col and king.piece_id == piece_id):
-                king.alive = False # this probably shouldn't be happening
-                king.dependent_on_square[row][col] = True
-                return True
+        piece = self.id_to_piece.get(piece_id)
+        if (piece != None and not piece.alive and piece.row == row and piece.col == col):
+            piece.alive = True
+            piece.dependent_squares |= 1 << ((row * 8) + col)
+            self.update_watchers(piece, 0, piece.dependent_squares)
+            self.squares[(row * 8) + col] = piece
+            if (self.track_attacks):
+                self.update_attack_counts(piece, self.attack_mask(piece))
+            self.count_piece(piece, 1)
+            return True
         print('failed to revive piece with id ' + str(piece_id) + ' at row' + str(row) + ' col ' + str(col))
-        print(len(self.pieces))
-        
-        for piece in self.pieces:
-            if (not piece.alive):
-                print(str(piece) + ' with id ' + str(piece.piece_id) + ' at row ' + str(piece.row) + ' col ' + str(piece.col))
-        
         return False
 
-    def swap_piece(self, piece_id, row, col, team, new_name): # used for promotion and undoing promotion
-        if (new_name == "Queen"):
-            new_piece = Pieces.Queen(row, col, team, piece_id)
-        elif (new_name == "Knight"):
-            new_piece = Pieces.Knight(row, col, team, piece_id)
-        elif (new_name == "Rook"):
-            new_piece = Pieces.Rook(row, col, team, piece_id)
-        elif (new_name == "Bishop"):
-            new_piece = Pieces.Bishop(row, col, team, piece_id)
-        elif (new_name == "Pawn"):
-            new_piece = Pieces.Pawn(row, col, team, piece_id)
-        else:
-            print('error')
-            
-        for i in range(len(self.pieces)):
-            piece = self.pieces[i]
-            if (piece.piece_id == piece_id):
-                self.pieces[i] = new_piece
-                self.pieces[i].gen_moves(self, None)
-                return True
-        return False
+    def swap_piece(self, piece, row, col, new_name): # used for promotion and undoing promotion
+        # the piece object stays the same and only changes its class, which every piece class allows by sharing one slot layout
+        self.count_piece(piece, -1)
+        piece.__class__ = piece_classes[new_name]
+        piece.row = row
+        piece.col = col
+        self.count_piece(piece, 1)
+        self.squares[(row * 8) + col] = piece
+        self.gen_piece_moves(piece, None)
+
+    def get_pieces(self):
+        pieces = []
+        for piece in self.pieces:
+            if (piece.alive):
+                pieces.append(piece)
+        for king in self.kings:
+            if (king.alive):
+                pieces.append(king)
+        return pieces
 
     def __str__(self):
         board_representation = np.empty([8,8], dtype=object)
@@ -284,50 +429,213 @@ class Board:
         moves = self.get_moves_from_state()
         for move in moves:
             if (str_move == str(move)):
-                castling_rights = self.get_castling_rights(self.team_to_move)
-                ep_col = self.en_passant_col
-                moves_since_advancement = self.moves_since_advancement
-                self.do_move(move)
-                return move, ep_col, castling_rights, moves_since_advancement
+                return self.do_move(move)
         # print('invalid move') happens too frequently with the GUI to be uncommented
         return None
 
-    def get_moves_from_state(self):
+    def get_moves_from_state(self): # legal moves are only generated the first time they are asked for, see MoveCache
+        if (self.legal_moves == None):
+            self.legal_moves = self.move_cache.get(self.board_hash)
+            if (self.legal_moves == None):
+                self.legal_moves = self.gen_legal_moves()
+                self.move_cache.put(self.board_hash, self.legal_moves)
         return self.legal_moves
 
+    def gen_en_passant_moves(self):
+        # en passant is only available for one ply, so instead of the pawns keeping it in their possible moves it is generated here
+        moves = []
+        if (self.en_passant_col != -1):
+            row = 4 if self.team_to_move else 3 # the row the capturing pawn has to be on
+            end_row = 5 if self.team_to_move else 2
+            captured_piece = self.get_piece_at(row, self.en_passant_col)
+            if (captured_piece == None or captured_piece.name != "Pawn" or captured_piece.team == self.team_to_move
+                or self.get_piece_at(end_row, self.en_passant_col) != None): # parse_fen drops such columns, but a bad one must not corrupt the board
+                return moves
+            for col in [self.en_passant_col - 1, self.en_passant_col + 1]:
+                piece = self.get_piece_at(row, col)
+                if (piece != None and piece.name == "Pawn" and piece.team == self.team_to_move):
+                    moves.append(Move(row, col, end_row, self.en_passant_col, "Pawn", is_capture = True, capture_name = "Pawn", capture_id = captured_piece.piece_id, is_ep = True))
+        return moves
+
+    def is_square_attacked(self, sq, by_team):
+        # tests if any piece of by_team attacks the square, looking outwards from the square with the precomputed attack tables
+        squares = self.squares
+        for attack_sq in knight_targets[sq]:
+            piece = squares[attack_sq]
+            if (piece != None and piece.team == by_team and piece.name == "Knight"):
+                return True
+        for attack_sq in pawn_targets[1 if by_team else 0][sq]: # a square is attacked by the pawns that it would attack as a pawn of the other team
+            piece = squares[attack_sq]
+            if (piece != None and piece.team == by_team and piece.name == "Pawn"):
+                return True
+        for attack_sq in king_targets[sq]:
+            piece = squares[attack_sq]
+            if (piece != None and piece.team == by_team and piece.name == "King"):
+                return True
+        for d in range(8):
+            slider_name = "Rook" if is_rook_direction[d] else "Bishop"
+            for attack_sq in ray_squares[sq][d]:
+                piece = squares[attack_sq]
+                if (piece != None): # line of sight is lost after hitting any piece
+                    if (piece.team == by_team and (piece.name == slider_name or piece.name == "Queen")):
+                        return True
+                    break
+        return False
+
+    def is_attacked(self, sq, by_team): # is_square_attacked for the board as it stands, which is a lookup when the attack counts are kept
+        if (not self.track_attacks):
+            return self.is_square_attacked(sq, by_team)
+        attacked = self.attack_counts[0 if by_team else 1][sq] > 0
+        if (self.debug_attacks and attacked != self.is_square_attacked(sq, by_team)):
+            print('attack count mismatch on square ' + str(sq) + ' for team ' + str(by_team))
+        return attacked
+
+    def find_checks_and_pins(self, king):
+        # walks the 8 rays out from the king and the knight and pawn squares around him once to find every piece giving check and every
+        # piece pinned to him. returns the number of checkers, a bit mask of the squares that block or capture the checker,
+        # and a dict of pinned square -> bit mask of the squares the pinned piece can still move to
+        squares = self.squares
+        king_sq = (king.row * 8) + king.col
+        enemy_team = not king.team
+        num_checkers = 0
+        check_mask = 0
+        pin_masks = {}
+        for d in range(8):
+            slider_name = "Rook" if is_rook_direction[d] else "Bishop"
+            ray_mask = 0
+            pinned_sq = -1
+            for sq in ray_squares[king_sq][d]:
+                ray_mask |= 1 << sq
+                piece = squares[sq]
+                if (piece != None):
+                    if (piece.team != enemy_team):
+                        if (pinned_sq != -1): # two of our own pieces in a row, so nothing is pinned along this ray
+                            break
+                        pinned_sq = sq
+                    else:
+                        if (piece.name == slider_name or piece.name == "Queen"):
+                            if (pinned_sq != -1):
+                                pin_masks[pinned_sq] = ray_mask
+                            else:
+                                num_checkers += 1
+                                check_mask |= ray_mask
+                        break
+        for sq in knight_targets[king_sq]:
+            piece = squares[sq]
+            if (piece != None and piece.team == enemy_team and piece.name == "Knight"):
+                num_checkers += 1
+                check_mask |= 1 << sq
+        for sq in pawn_targets[0 if king.team else 1][king_sq]:
+            piece = squares[sq]
+            if (piece != None and piece.team == enemy_team and piece.name == "Pawn"):
+                num_checkers += 1
+                check_mask |= 1 << sq
+        return num_checkers, check_mask, pin_masks
+
+    def king_move_is_safe(self, king, move):
+        # the king is taken out of the mailbox so the square he leaves can't block an attack on the square he goes to
+        start_sq = (king.row * 8) + king.col
+        self.squares[start_sq] = None
+        is_safe = not self.is_square_attacked((move.end_row * 8) + move.end_col, not king.team)
+        self.squares[start_sq] = king
+        return is_safe
+
+    def en_passant_is_safe(self, king, move):
+        # en passant takes two pieces off of one row at once, which the pin masks can't see, so it is tested directly in the mailbox
+        start_sq = (move.start_row * 8) + move.start_col
+        capture_sq = (move.start_row * 8) + move.end_col
+        end_sq = (move.end_row * 8) + move.end_col
+        pawn = self.squares[start_sq]
+        captured_piece = self.squares[capture_sq]
+        self.squares[start_sq] = None
+        self.squares[capture_sq] = None
+        self.squares[end_sq] = pawn
+        is_safe = not king.is_in_check(self)
+        self.squares[end_sq] = None
+        self.squares[capture_sq] = captured_piece
+        self.squares[start_sq] = pawn
+        return is_safe
+
     def gen_legal_moves(self):
+        # instead of trying out every move, the checks and pins on the king are found once and used to filter the possible moves
+        king = self.kings[0] if self.team_to_move else self.kings[1]
+        num_checkers, check_mask, pin_masks = self.find_checks_and_pins(king)
+
         moves = []
-        num_checked = 0
+        for move in king.possible_moves:
+            if (self.king_move_is_safe(king, move)):
+                moves.append(move)
+        if (num_checkers > 1): # in double check only the king can move
+            return moves
+        if (num_checkers == 0):
+            self.gen_castling_moves(king, moves)
+
+        for move in self.gen_en_passant_moves():
+            if (self.en_passant_is_safe(king, move)):
+                moves.append(move)
+
         for piece in self.pieces:
             if (piece.alive and piece.team == self.team_to_move):
-                for move in piece.possible_moves:
-                    ep_col = self.en_passant_col
-                    castling_rights = self.get_castling_rights(self.team_to_move)
-                    team = self.team_to_move
-                    self.do_move(move, is_test = True)
-                    if (not self.team_in_check(team)): # moves are only legal if they do not put your king in check
-                        moves.append(move)
-                    self.undo_move(move, ep_col, castling_rights, 0, is_test = True)
-                    num_checked += 1
-        for king in self.kings:
-            if (king.alive and king.team == self.team_to_move):
-                for move in king.possible_moves:
-                    ep_col = self.en_passant_col
-                    castling_rights = self.get_castling_rights(self.team_to_move)
-                    team = self.team_to_move
-                    self.do_move(move, is_test = True)
-                    if (not self.team_in_check(team)): # moves are only legal if they do not put your king in check
-                        moves.append(move)
-                    self.undo_move(move, ep_col, castling_rights, 0, is_test = True)
-                    num_checked += 1
+                allowed_mask = pin_masks.get((piece.row * 8) + piece.col, -1) # -1 has every bit set
+                if (num_checkers == 1):
+                    allowed_mask &= check_mask
+                if (allowed_mask == -1):
+                    moves += piece.possible_moves
+                else:
+                    for move in piece.possible_moves:
+                        if (allowed_mask & (1 << ((move.end_row * 8) + move.end_col))):
+                            moves.append(move)
                 
-        self.legal_moves = moves
+        return moves
+
+    def gen_castling_moves(self, king, moves):
+        # castling depends on whether squares are attacked, which can change with any move on the board, so instead of the king
+        # regenerating after every move it is only worked out here. the king can't be in check, pass through or land on an attacked square,
+        # and the squares between him and the rook have to be empty (the square the rook moves through can be attacked)
+        squares = self.squares
+        king_sq = (king.row * 8) + king.col
+        if (king.can_castle_queenside and squares[king_sq - 1] == None and squares[king_sq - 2] == None and squares[king_sq - 3] == None
+            and not self.is_attacked(king_sq - 1, not king.team) and not self.is_attacked(king_sq - 2, not king.team)):
+            moves.append(Move(king.row, king.col, king.row, king.col - 2, "King", is_qs_castle = True))
+        if (king.can_castle_kingside and squares[king_sq + 1] == None and squares[king_sq + 2] == None
+            and not self.is_attacked(king_sq + 1, not king.team) and not self.is_attacked(king_sq + 2, not king.team)):
+            moves.append(Move(king.row, king.col, king.row, king.col + 2, "King", is_ks_castle = True))
+
+    def resolve_move(self, start_sq, end_sq, promotion = None):
+        # the legal move from start_sq to end_sq, promoting to promotion (a queen if it is None), or None if there isn't one.
+        # only the moving piece's own possible moves are searched, so replaying a game doesn't have to generate every legal move
+        piece = self.squares[start_sq]
+        if (piece == None or piece.team != self.team_to_move):
+            return None
+        king = self.kings[0] if self.team_to_move else self.kings[1]
+        num_checkers, check_mask, pin_masks = self.find_checks_and_pins(king)
+        candidates = list(piece.possible_moves)
+        if (piece is king and num_checkers == 0):
+            self.gen_castling_moves(king, candidates)
+        elif (piece.name == "Pawn"):
+            candidates += self.gen_en_passant_moves()
+
+        for move in candidates:
+            if ((move.start_row * 8) + move.start_col != start_sq or (move.end_row * 8) + move.end_col != end_sq):
+                continue
+            if ((move.piece_name != (promotion if promotion != None else "Queen")) if move.is_promotion else (promotion != None)):
+                continue
+            # the same tests gen_legal_moves makes, for this one move
+            if (piece is king):
+                return move if (move.is_qs_castle or move.is_ks_castle or self.king_move_is_safe(king, move)) else None
+            if (move.is_ep):
+                return move if self.en_passant_is_safe(king, move) else None
+            if (num_checkers > 1):
+                return None
+            allowed_mask = pin_masks.get(start_sq, -1)
+            if (num_checkers == 1):
+                allowed_mask &= check_mask
+            return move if (allowed_mask & (1 << end_sq)) else None
+        return None
 
     def team_in_check(self, team):
-        if (team):
-            return self.kings[0].is_in_check(self)
-        else:
-            return self.kings[1].is_in_check(self)
+        king = self.kings[0] if team else self.kings[1]
+        return self.is_attacked((king.row * 8) + king.col, not team)
 
     def get_castling_rights(self, team):
         if (team):
@@ -335,12 +643,48 @@ class Board:
         else:
             return (self.kings[1].can_castle_queenside, self.kings[1].can_castle_kingside)
 
+    def get_castling_flags(self): # castling rights of both teams packed into 4 bit flags, see castling_keys
+        flags = 0
+        if (self.kings[0].can_castle_queenside):
+            flags |= 1
+        if (self.kings[0].can_castle_kingside):
+            flags |= 2
+        if (self.kings[1].can_castle_queenside):
+            flags |= 4
+        if (self.kings[1].can_castle_kingside):
+            flags |= 8
+        return flags
+
+    def set_castling_flags(self, flags):
+        self.kings[0].can_castle_queenside = bool(flags & 1)
+        self.kings[0].can_castle_kingside = bool(flags & 2)
+        self.kings[1].can_castle_queenside = bool(flags & 4)
+        self.kings[1].can_castle_kingside = bool(flags & 8)
+
+    def move_rook(self, row, start_col, end_col): # only used for castling, where the rook moves along its row
+        rook = self.squares[(row * 8) + start_col]
+        rook.col = end_col
+        self.squares[(row * 8) + start_col] = None
+        self.squares[(row * 8) + end_col] = rook
+
     def do_move(self, move, is_test = False): # it is a test if the move is only being performed to see if it would lead to the king being in check, and therefore shouldn't update moves
         # remove the piece that was captured if applicable
-        castling_rights = self.get_castling_rights(self.team_to_move)
+        castling_rights = self.get_castling_flags() # the rights of both teams, since a capture can take away the enemy's rights too
         ep_col = self.en_passant_col
         moves_since_advancement = self.moves_since_advancement
-        
+        board_hash = self.board_hash
+
+        # the piece that moves has to be found before the mailbox changes
+        move_piece = self.squares[(move.start_row * 8) + move.start_col]
+        team = move_piece.team
+        is_pawn_move = (move_piece.name == "Pawn") # promotion changes the piece's name
+
+        # tests don't need the hash, and undo restores it anyway
+        if (not is_test):
+            new_hash = board_hash ^ zobrist_keys[0] ^ zobrist_piece_key(move_piece.name, team, move.start_row, move.start_col)
+            new_hash ^= zobrist_piece_key(move.piece_name, team, move.end_row, move.end_col) # the piece name of a promotion is what the pawn becomes
+            if (ep_col != -1):
+                new_hash ^= zobrist_keys[5 + ep_col]
         
         if (move.is_capture):
             if (move.is_ep): # with en passant, the piece that is captured is not on the tile that is moved to
@@ -349,37 +693,53 @@ class Board:
             else:
                 capture_row = move.end_row
                 capture_col = move.end_col
+            if (not is_test):
+                new_hash ^= zobrist_piece_key(move.capture_name, not team, capture_row, capture_col)
+            self.captured_pieces.append(self.get_piece_at(capture_row, capture_col))
             self.kill_piece_at(capture_row, capture_col)
 
         # update en passant information
         self.en_passant_col = -1 # en passant capture is only available for one ply
         if (move.piece_name == "Pawn" and abs(move.start_row - move.end_row) == 2):
             self.en_passant_col = move.start_col
+            if (not is_test):
+                new_hash ^= zobrist_keys[5 + move.start_col]
             #if (not is_test):
                 #print('en peasant')
         
 
         if (move.is_qs_castle or move.is_ks_castle): # king will be moved later during move generation
             if (move.is_qs_castle):
-                self.get_piece_at(move.start_row, 0).col = (move.end_col + 1) # rook ends to the right of the king
+                rook_start_col, rook_end_col = 0, move.end_col + 1 # rook ends to the right of the king
             else: # means it is a kingside castle
-                self.get_piece_at(move.start_row, 7).col = (move.end_col - 1) # rook ends to the left of the king
+                rook_start_col, rook_end_col = 7, move.end_col - 1 # rook ends to the left of the king
+            self.move_rook(move.start_row, rook_start_col, rook_end_col)
+            if (not is_test):
+                new_hash ^= zobrist_piece_key("Rook", team, move.start_row, rook_start_col) ^ zobrist_piece_key("Rook", team, move.start_row, rook_end_col)
         # the rook should be dependent on both the starting and end squares of the castling move if it is valid
 
+        # the mailbox is updated before any moves are generated so every piece sees the new position
+        self.squares[(move.start_row * 8) + move.start_col] = None
+        self.squares[(move.end_row * 8) + move.end_col] = move_piece
+
+        # moving the king or a rook, or capturing a rook, loses the castling rights that depend on it
+        castling_flags = castling_rights & castling_masks[(move.start_row * 8) + move.start_col] & castling_masks[(move.end_row * 8) + move.end_col]
+        if (castling_flags != castling_rights):
+            self.set_castling_flags(castling_flags)
+
+        # the pieces to regenerate are found before the moving piece changes what it watches
+        if (not is_test):
+            update_pieces = self.pieces_to_update(move, move_piece)
+
         # have to update the piece that moves before all of the others because it's new position needs to be known
-        move_piece = self.get_piece_at(move.start_row, move.start_col)
         if (move.is_promotion):
-            self.swap_piece(move_piece.piece_id, move.end_row, move.end_col, move_piece.team, move.piece_name)
+            self.swap_piece(move_piece, move.end_row, move.end_col, move.piece_name)
         else:
-            move_piece.gen_moves(self, move)
+            self.gen_piece_moves(move_piece, move)
         
         if (not is_test):
-            for piece in self.pieces:
-                if (piece.alive and piece != move_piece and piece.dependent_on_move(move)):
-                    piece.gen_moves(self, move)
-            for king in self.kings:
-                if (king.alive and king != move_piece and king.dependent_on_move(move)):
-                    king.gen_moves(self, move)
+            for piece in update_pieces:
+                self.gen_piece_moves(piece, move)
                 
         # swaps the team to move
         self.team_to_move = not self.team_to_move
@@ -387,17 +747,23 @@ class Board:
         if (not is_test):
             self.total_moves += 1
             # updates information for the 50 move rule
-            if (not(move.is_capture or move_piece.name == "Pawn")):
+            if (not(move.is_capture or is_pawn_move)):
                 self.moves_since_advancement += 1
             else:
                 self.moves_since_advancement = 0
 
-            # finally, generates the legal moves for the next player
-            self.gen_legal_moves()
+            self.board_hash = new_hash ^ castling_keys[castling_rights ^ castling_flags]
+            if (self.debug_hash):
+                self.check_board_hash(move, 'move')
+            if (self.debug_attacks):
+                self.check_attack_counts(move, 'move')
 
-        return move, ep_col, castling_rights, moves_since_advancement
+            # the legal moves for the next player are generated when they are needed
+            self.legal_moves = None
 
-    def undo_move(self, move, ep_col, castling_rights, moves_since_advancement, is_test = False): # this information needs to be stored somewhere, because
+        return move, ep_col, castling_rights, moves_since_advancement, board_hash
+
+    def undo_move(self, move, ep_col, castling_rights, moves_since_advancement, board_hash = None, is_test = False): # this information needs to be stored somewhere, because
                                                         # it is impossible to know with certainty how these values change
                                                         # on an undone move
         # starts by fixing the team to move
@@ -417,24 +783,23 @@ class Board:
         # undoes castling
         if (move.is_qs_castle or move.is_ks_castle): # king will be moved later during move generation
             if (move.is_qs_castle):
-                self.get_piece_at(move.start_row, move.end_col + 1).col = 0 # rook ends up on the far left
+                self.move_rook(move.start_row, move.end_col + 1, 0) # rook ends up on the far left
             else: # means it is a kingside castle
-                self.get_piece_at(move.start_row, move.end_col - 1).col = 7 # rook ends up on the far right
+                self.move_rook(move.start_row, move.end_col - 1, 7) # rook ends up on the far right
         # the rook should be dependent on both the starting and end squares of the castling move if it is valid
 
-        # updates castling rights for the correct king
-        if (self.team_to_move):
-            self.kings[0].can_castle_queenside = castling_rights[0]
-            self.kings[0].can_castle_kingside = castling_rights[1]
-        else:
-            self.kings[1].can_castle_queenside = castling_rights[0]
-            self.kings[1].can_castle_kingside = castling_rights[1]
+        # restores castling rights for both kings
+        self.set_castling_flags(castling_rights)
+        if (board_hash != None):
+            self.board_hash = board_hash
 
         
         # first needs to figure out the piece that moved there
         move_piece = self.get_piece_at(move.end_row, move.end_col)
         if (move_piece == None):
             print('cant find piece that moved')
+        self.squares[(move.end_row * 8) + move.end_col] = None
+        self.squares[(move.start_row * 8) + move.start_col] = move_piece
         # then adds back the piece that was captured if applicable (must be done later because the added piece generates moves)
         if (move.is_capture):
             if (move.is_ep): # with en passant, the piece that is captured is not on the tile that is moved to
@@ -443,23 +808,25 @@ class Board:
             else:
                 capture_row = move.end_row
                 capture_col = move.end_col
-            self.revive_piece_at(capture_row, capture_col, not self.team_to_move, move.capture_id)
+            self.revive_piece_at(capture_row, capture_col, not self.team_to_move, self.captured_pieces.pop().piece_id)
+
+        update_pieces = self.pieces_to_update(move, move_piece) # includes the revived piece, which watches its own square
 
         # needs to move back the piece that moved
         if (move.is_promotion):
-            self.swap_piece(move_piece.piece_id, move.start_row, move.start_col, move_piece.team, "Pawn")
+            self.swap_piece(move_piece, move.start_row, move.start_col, "Pawn")
         else:
-            move_piece.gen_moves(self, move, True)
+            self.gen_piece_moves(move_piece, move, True)
         
-        for piece in self.pieces:
-            if (piece.alive and piece != move_piece and piece.dependent_on_move(move)):
-                piece.gen_moves(self, move, True)
-        for king in self.kings:
-            if (king.alive and king != move_piece and king.dependent_on_move(move)):
-                king.gen_moves(self, move, True)
+        for piece in update_pieces:
+            self.gen_piece_moves(piece, move, True)
 
         if (not is_test):
-            self.gen_legal_moves()
+            if (self.debug_hash):
+                self.check_board_hash(move, 'undo')
+            if (self.debug_attacks):
+                self.check_attack_counts(move, 'undo')
+            self.legal_moves = None
             
 
             
@@ -0,0 +1,127 @@
+# FEN (Forsyth-Edwards Notation) describes a whole position in one line: the pieces on each row from black's back rank down to white's,
+# the team to move, the castling rights, the en passant square and the halfmove and fullmove counters.
+# Board and BitBoard both use these functions, so they only have to place pieces and copy the counters.
+
+start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+fen_piece_names = {'p': "Pawn", 'n': "Knight", 'b': "Bishop", 'r': "Rook", 'q': "Queen", 'k': "King"}
+fen_piece_letters = {"Pawn": 'p', "Knight": 'n', "Bishop": 'b', "Rook": 'r', "Queen": 'q', "King": 'k'}
+
+# the castling letters in FEN order, with their bit in the castling flags of Board.get_castling_flags
+fen_castling_flags = [('K', 2), ('Q', 1), ('k', 8), ('q', 4)]
+# the squares the king and rook need to be on for each castling flag to be kept
+castling_home_squares = {1: (4, 0), 2: (4, 7), 4: (60, 56), 8: (60, 63)}
+
+col_letters = "abcdefgh"
+
+def parse_fen(fen):
+    # returns (pieces, team_to_move, castling_flags, en_passant_col, moves_since_advancement, total_moves), where pieces is a list
+    # of (name, team, row, col) in square order, or None if the string isn't a valid position
+    fields = fen.split()
+    if (len(fields) < 4):
+        print('invalid fen, expected at least 4 fields: ' + fen)
+        return None
+
+    rows = fields[0].split('/')
+    if (len(rows) != 8):
+        print('invalid fen, expected 8 rows: ' + fen)
+        return None
+
+    squares = [None] * 64
+    for i in range(8):
+        row = 7 - i # the first row in a fen is black's back rank
+        col = 0
+        for char in rows[i]:
+            if (char.isdigit()):
+                col += int(char)
+            elif (char.lower() in fen_piece_names and col < 8):
+                squares[(row * 8) + col] = (fen_piece_names[char.lower()], char.isupper())
+                col += 1
+            else:
+                col = -1
+                break
+        if (col != 8):
+            print('invalid fen, row ' + rows[i] + ' does not have 8 squares: ' + fen)
+            return None
+
+    pieces = []
+    for sq in range(64):
+        if (squares[sq] != None):
+            name, team = squares[sq]
+            if (name == "Pawn" and (sq < 8 or sq >= 56)):
+                print('invalid fen, pawn on a back rank: ' + fen)
+                return None
+            pieces.append((name, team, sq // 8, sq % 8))
+    for team in [True, False]:
+        if (sum(1 for name, piece_team, row, col in pieces if name == "King" and piece_team == team) != 1):
+            print('invalid fen, each team needs exactly one king: ' + fen)
+            return None
+
+    if (fields[1] not in ['w', 'b']):
+        print('invalid fen, unknown team to move ' + fields[1] + ': ' + fen)
+        return None
+    team_to_move = (fields[1] == 'w')
+
+    castling_flags = 0
+    if (fields[2] != '-'):
+        for letter, flag in fen_castling_flags:
+            if (letter in fields[2]):
+                castling_flags |= flag
+    # rights are dropped if the king or rook isn't on its starting square, since castling never checks for the rook itself
+    for flag, (king_sq, rook_sq) in castling_home_squares.items():
+        team = (flag < 4)
+        if (squares[king_sq] != ("King", team) or squares[rook_sq] != ("Rook", team)):
+            castling_flags &= ~flag
+
+    en_passant_col = -1
+    if (fields[3] != '-'):
+        if (len(fields[3]) != 2 or fields[3][0] not in col_letters or fields[3][1] != ('6' if team_to_move else '3')):
+            print('invalid fen, bad en passant square ' + fields[3] + ': ' + fen)
+            return None
+        en_passant_col = col_letters.index(fields[3][0])
+        # like castling rights, the square is dropped unless the pawn that just moved two squares is there to be taken,
+        # with the squares it passed over and came from empty
+        capture_row, target_row, origin_row = (4, 5, 6) if team_to_move else (3, 2, 1)
+        if (squares[(capture_row * 8) + en_passant_col] != ("Pawn", not team_to_move) or squares[(target_row * 8) + en_passant_col] != None
+            or squares[(origin_row * 8) + en_passant_col] != None):
+            en_passant_col = -1
+
+    # the counters are optional, since positions from EPD suites leave them out
+    try:
+        moves_since_advancement = int(fields[4]) if len(fields) > 4 else 0
+        full_moves = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        print('invalid fen, the move counters are not numbers: ' + fen)
+        return None
+    total_moves = (2 * (max(full_moves, 1) - 1)) + (0 if team_to_move else 1) # total_moves counts plys, the fullmove number counts whole moves
+
+    return pieces, team_to_move, castling_flags, en_passant_col, moves_since_advancement, total_moves
+
+def make_fen(squares, team_to_move, castling_flags, en_passant_col, moves_since_advancement, total_moves):
+    # squares is a list of the (name, team) on each square, or None for an empty square
+    rows = []
+    for row in range(7, -1, -1):
+        row_str = ''
+        empty = 0
+        for col in range(8):
+            piece = squares[(row * 8) + col]
+            if (piece == None):
+                empty += 1
+            else:
+                if (empty > 0):
+                    row_str += str(empty)
+                    empty = 0
+                name, team = piece
+                row_str += fen_piece_letters[name].upper() if team else fen_piece_letters[name]
+        if (empty > 0):
+            row_str += str(empty)
+        rows.append(row_str)
+
+    castling = ''.join(letter for letter, flag in fen_castling_flags if castling_flags & flag)
+    if (en_passant_col != -1):
+        en_passant = col_letters[en_passant_col] + ('6' if team_to_move else '3')
+    else:
+        en_passant = '-'
+
+    return ' '.join(['/'.join(rows), 'w' if team_to_move else 'b', castling if castling else '-', en_passant,
+                     str(moves_since_advancement), str((total_moves // 2) + 1)])
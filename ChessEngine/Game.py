@@ -1,27 +1,47 @@
 from BoardState import Board
+from BitBoard import BitBoard
+from MoveCache import MoveCache
+from Move import unpack_move, parse_uci
+from Fen import start_fen
+
+# the status of a position on its own, before repetition and the 50 move rule are taken into account
+ONGOING = 0
+INSUFFICIENT_MATERIAL = 1
+CHECKMATE = 2
+STALEMATE = 3
+TABLEBASE_WIN = 4 # the team to move wins according to the endgame tablebase
+TABLEBASE_LOSS = 5
+TABLEBASE_DRAW = 6
+
+MOVER_LOST = 2 # is_game_over's result when the tablebase says the team to move wins, so the player who just moved lost
+
+def mover_reward(end_value): # the reward of the player who just moved for a finished game's is_game_over result
+    return -1 if end_value == MOVER_LOST else end_value
 
 class Game:
-    def __init__(self):
-        self.board = Board()
+    def __init__(self, bitboard = False, fen = None, board = None, tablebase = None): # bitboard selects the faster integer bitboard position instead of the Piece object board,
+                                                                                      # fen optionally gives a position to start from instead of the initial one,
+                                                                                      # board is an already set up board to play on instead,
+                                                                                      # and tablebase is an optional Tablebase that ends the game as soon as the position is in one of its tables
+        if (board != None):
+            self.board = board
+        elif (bitboard):
+            self.board = BitBoard(fen = fen)
+        else:
+            self.board = Board(fen = fen)
         self.undo_info_history = []
-        self.times_at_board = {}
+        self.status_cache = MoveCache() # board hash -> position status, kept in the same kind of bounded cache as the legal moves
+        self.start_fen = start_fen if (board == None and fen == None) else self.board.get_fen() # the position the game was started from, for game records
         self.board_id = self.board.get_board_hash()
-        self.times_at_board[self.board_id] = 1
+        self.hash_history = [self.board_id] # the hash of every position of the game so far, the current one last
+        self.tablebase = tablebase
 
     def do_str_move(self, str_move):
         undo_info = self.board.do_str_move(str_move)
         if (undo_info != None):
             self.undo_info_history.append(undo_info)
-
-            board_id = self.board.get_board_hash()
-            self.board_id = board_id
-            if (board_id in self.times_at_board):
-                self.times_at_board[board_id] = self.times_at_board[board_id] + 1
-                # print('duplicate board')
-            else:
-                self.times_at_board[board_id] = 1
-            
-            #game_status = self.is_game_over()
+            self.board_id = self.board.get_board_hash()
+            self.hash_history.append(self.board_id)
             return undo_info[0] # the actual move object corresponding to the string
         return None
 
@@ -29,20 +49,42 @@ class Game:
         undo_info = self.board.do_move(move)
         if (undo_info != None):
             self.undo_info_history.append(undo_info)
-
-            board_id = self.board.get_board_hash()
-            self.board_id = board_id
-            # print('do: ' + str(board_id))
-            if (board_id in self.times_at_board):
-                self.times_at_board[board_id] = self.times_at_board[board_id] + 1
-                # print('duplicate board')
-            else:
-                self.times_at_board[board_id] = 1
-            
-            #game_status = self.is_game_over()
+            self.board_id = self.board.get_board_hash()
+            self.hash_history.append(self.board_id)
             return True
         return False
 
+    def resolve_move(self, move):
+        # the legal Move for a uci string or a packed move, or None if it isn't legal. the board only looks at the moving piece
+        # (see Board.resolve_move), so this is much cheaper than searching the legal moves of the position
+        if (isinstance(move, str)):
+            parsed = parse_uci(move)
+            if (parsed == None):
+                return None
+            start_sq, end_sq, promotion = parsed
+        else:
+            move = unpack_move(move)
+            start_sq = (move.start_row * 8) + move.start_col
+            end_sq = (move.end_row * 8) + move.end_col
+            promotion = move.piece_name if move.is_promotion else None
+        return self.board.resolve_move(start_sq, end_sq, promotion)
+
+    def replay(self, moves, validate = False):
+        # plays a list of uci strings or packed moves, such as a stored game, and returns how many were played before the first illegal one.
+        # moves are resolved from the moving piece alone, so the legal moves of the positions in between are never generated
+        # unless validate is set, which also checks each move against the full list of legal moves before playing it
+        for i in range(len(moves)):
+            move = self.resolve_move(moves[i])
+            if (move != None and validate):
+                code = move.pack()
+                if (not any(legal_move.pack() == code for legal_move in self.get_legal_moves())):
+                    move = None
+            if (move == None):
+                print('could not replay move ' + str(i) + ': ' + str(moves[i]))
+                return i
+            self.do_move(move)
+        return len(moves)
+
     def get_legal_moves(self):
         return self.board.get_moves_from_state()
 
@@ -52,87 +94,71 @@ class Game:
     def undo_move(self):
         if (len(self.undo_info_history) > 0):
             undo_info = self.undo_info_history.pop()
-            
-            if (not self.board_id in self.times_at_board):
-                print('got tripped up when undoing')
-            else:
-                self.times_at_board[self.board_id] = self.times_at_board[self.board_id] - 1
-                if (self.times_at_board[self.board_id] == 0):
-                    del self.times_at_board[self.board_id]
-            
-            self.board.undo_move(undo_info[0], undo_info[1], undo_info[2], undo_info[3])
-            board_id = self.board.get_board_hash()
-            self.board_id = board_id
-            # print('undo: ' + str(board_id))
-            if (self.board_id not in self.times_at_board):
-                print('undid to unrecognized board')
-                print('move: ' + str(undo_info[0]))
+            self.board.undo_move(*undo_info)
+            self.hash_history.pop()
+            self.board_id = self.hash_history[-1]
         else:
             print('cannot undo past starting board')
 
+    def get_move_history(self): # the moves played since the start of the game, oldest first
+        return [undo_info[0] for undo_info in self.undo_info_history]
+
     def get_board_hash(self):
         return self.board_id
 
-    def get_nnet_inputs(self):
-        if (self.board_id in self.times_at_board):
-            return self.board.nnet_inputs(self.times_at_board[self.board_id])
-        else:
-            print('error, didnt recognize current board')
-            return self.board.nnet_inputs(0)
+    def get_fen(self):
+        return self.board.get_fen()
+
+    def reversible_window(self):
+        # the number of earlier positions that could still repeat the current one, since nothing before the last capture or pawn move can
+        return min(self.board.moves_since_advancement, len(self.hash_history) - 1)
+
+    def times_at_board(self): # how many times the current position has been reached, counting this time
+        # only every other position in the window has the same team to move, and the team to move is part of the hash
+        window = self.reversible_window()
+        start = len(self.hash_history) - 1 - window
+        return self.hash_history[start + (window % 2)::2].count(self.board_id)
+
+    def clone(self): # a copy of the game with its own board, which keeps the repetition counts but can't undo past the current position
+        game = Game(board = self.board.clone(), tablebase = self.tablebase)
+        game.hash_history = self.hash_history[-1 - self.reversible_window():]
+        return game
+
+    def get_nnet_inputs(self, out = None): # out is an optional [8, 8, 20] float32 array (such as one slot of a batch) to write the inputs into
+        return self.board.nnet_inputs(self.times_at_board(), out)
+
+    def position_status(self): # the part of the game status that only depends on the position, cached by board hash
+        status = self.status_cache.get(self.board_id)
+        if (status == None):
+            result = self.tablebase.probe(self.board) if self.tablebase != None else None
+            if (self.board.insufficient_material()):
+                status = INSUFFICIENT_MATERIAL
+            elif (result != None and result != (-1, 0)): # checkmates are in the tables too, but are still reported as checkmates below
+                status = [TABLEBASE_LOSS, TABLEBASE_DRAW, TABLEBASE_WIN][result[0] + 1] # the tablebase result of the team to move
+            elif (len(self.board.get_moves_from_state()) == 0):
+                status = CHECKMATE if self.board.team_in_check(self.board.team_to_move) else STALEMATE
+            else:
+                status = ONGOING
+            self.status_cache.put(self.board_id, status)
+        return status
 
     def is_game_over(self, print_reason = False):
+        # returns -1 while the game goes on, 0 for a draw, 1 when the player who just moved has won (checkmate, or a tablebase win),
+        # and MOVER_LOST when a tablebase says the team to move wins. use mover_reward to turn a finished game's result into a reward
+        status = self.position_status()
 
         # insufficient material list:
         # king vs king
         # king and bishop vs king
         # king and knight vs king
         # king and bishop vs king and same color bishop
-        insufficient_material = True
-        bishop_counts = [0, 0]
-        bishop_colors = [False, False]
-        knight_count = 0
-        
-        for piece in self.board.pieces:
-            if (insufficient_material and piece.alive):
-                if (piece.name != "Bishop" and piece.name != "Knight"):
-                    insufficient_material = False
-                elif (piece.name == "Bishop"):
-                    bishop_color = ((piece.row + piece.col) % 2 == 0)
-                    if (piece.team):
-                        bishop_counts[0] = bishop_counts[0] + 1
-                        if (bishop_counts[0] > 1):
-                            insufficient_material = False
-                        else:
-                            bishop_colors[0] = bishop_color
-                    else:
-                        bishop_counts[1] = bishop_counts[1] + 1
-                        if (bishop_counts[1] > 1):
-                            insufficient_material = False
-                        else:
-                            bishop_colors[1] = bishop_color
-                elif (piece.name == "Knight"):
-                    knight_count += 1
-                    if (knight_count > 1):
-                        insufficient_material = False
-                        
-        if (insufficient_material):
-            if (knight_count > 0 and (bishop_counts[0] + bishop_counts[1] > 0)):
-                insufficient_material = False
-            elif (bishop_counts[0] == 1 and bishop_counts[1] == 1):
-                if (bishop_colors[0] != bishop_colors[1]):
-                    insufficient_material = False
-
-        if (insufficient_material):
+        if (status == INSUFFICIENT_MATERIAL):
             if (print_reason):
                 print('Draw by insufficient material')
             return 0 # draw by insufficient material
 
         # threefold repetition
-        if self.board_id not in self.times_at_board:
-            print('could not find ' + str(self.board_id))
-            print(self.times_at_board)
-            print('ERROR: got tripped up when checking for 3fold repetition')
-        elif (self.times_at_board[self.board_id] == 3):
+        if (self.times_at_board() == 3):
             if (print_reason):
                 print('Draw by threefold repetition')
             return 0 # draw by threefold repetition
@@ -145,28 +171,31 @@ class Game:
             return 0 # draw by the 50 move rule
             
         
-        move_list = self.board.get_moves_from_state()
-        if (len(move_list) == 0):
-            if (self.board.team_in_check(self.board.team_to_move)):
-                if (print_reason):
-                    print('Checkmate')
-                return 1 # checkmate
-            else:
-                if (print_reason):
-                    print('Stalemate')
-                return 0 # stalemate
+        if (status == CHECKMATE):
+            if (print_reason):
+                print('Checkmate')
+            return 1 # checkmate
+        elif (status == TABLEBASE_LOSS):
+            if (print_reason):
+                print('Tablebase loss for the team to move')
+            return 1 # the player who just moved has a forced mate
+        elif (status == TABLEBASE_WIN):
+            if (print_reason):
+                print('Tablebase win for the team to move')
+            return MOVER_LOST
+        elif (status == TABLEBASE_DRAW):
+            if (print_reason):
+                print('Tablebase draw')
+            return 0
+        elif (status == STALEMATE):
+            if (print_reason):
+                print('Stalemate')
+            return 0 # stalemate
         else:
             return -1 # game still going
 
     def get_pieces(self):
-        pieces = []
-        for piece in self.board.pieces:
-            if (piece.alive):
-                pieces.append(piece)
-        for king in self.board.kings:
-            if (king.alive):
-                pieces.append(king)
-        return pieces
+        return self.board.get_pieces()
 
     def is_square_friendly(self, row, col):
         piece_on_square = self.board.get_piece_at(row, col)
@@ -0,0 +1,240 @@
+import time
+from Game import Game, MOVER_LOST
+from Fen import start_fen, col_letters
+
+# Finished games are appended to a record file one at a time, either as PGN or as compact uci lines, so self-play can archive any
+# number of games without holding them, and the readers are generators that replay one game at a time back into a Game.
+# A uci line is the result, the starting fen (or startpos) and the moves in uci notation, separated by tabs:
+#     1-0	startpos	e2e4 e7e5 d1h5 b8c6 f1c4 g8f6 h5f7
+
+san_letters = {"Knight": 'N', "Bishop": 'B', "Rook": 'R', "Queen": 'Q', "King": 'K'}
+san_names = {'N': "Knight", 'B': "Bishop", 'R': "Rook", 'Q': "Queen", 'K': "King"}
+results = ['1-0', '0-1', '1/2-1/2', '*']
+
+def square_name(row, col):
+    return col_letters[col] + str(row + 1)
+
+def game_result(game): # the pgn result of the game as it stands, * if it isn't over
+    status = game.is_game_over()
+    if (status == 1):
+        return '0-1' if game.get_team_to_move() else '1-0' # the team to move is the one that got checkmated
+    elif (status == MOVER_LOST): # or has a tablebase win
+        return '1-0' if game.get_team_to_move() else '0-1'
+    elif (status == 0):
+        return '1/2-1/2'
+    return '*'
+
+def is_pawn_move(move): # a promotion's piece name is the piece the pawn becomes
+    return move.piece_name == "Pawn" or move.is_promotion
+
+def play_san(game, move): # plays the move on the game and returns it in standard algebraic notation, which depends on the position it is played from
+    if (move.is_qs_castle):
+        san = 'O-O-O'
+    elif (move.is_ks_castle):
+        san = 'O-O'
+    elif (is_pawn_move(move)):
+        san = (col_letters[move.start_col] + 'x' if move.is_capture else '') + square_name(move.end_row, move.end_col)
+        if (move.is_promotion):
+            san += '=' + san_letters[move.piece_name]
+    else:
+        # other pieces of the same kind that can reach the square have to be told apart by the file, the rank, or both
+        others = [other for other in game.get_legal_moves() if other.piece_name == move.piece_name and not other.is_promotion and
+                  (other.end_row, other.end_col) == (move.end_row, move.end_col) and (other.start_row, other.start_col) != (move.start_row, move.start_col)]
+        san = san_letters[move.piece_name]
+        if (len(others) > 0):
+            if (all(other.start_col != move.start_col for other in others)):
+                san += col_letters[move.start_col]
+            elif (all(other.start_row != move.start_row for other in others)):
+                san += str(move.start_row + 1)
+            else:
+                san += square_name(move.start_row, move.start_col)
+        san += ('x' if move.is_capture else '') + square_name(move.end_row, move.end_col)
+
+    game.do_move(move)
+    if (game.board.team_in_check(game.get_team_to_move())):
+        san += '#' if len(game.get_legal_moves()) == 0 else '+'
+    return san
+
+def from_san(game, san): # the legal move of the game's current position that san names, or None if there isn't exactly one
+    san = san.rstrip('+#!?')
+    if (san in ['O-O', '0-0', 'O-O-O', '0-0-0']):
+        queenside = (len(san) == 5)
+        moves = [move for move in game.get_legal_moves() if (move.is_qs_castle if queenside else move.is_ks_castle)]
+        return moves[0] if len(moves) == 1 else None
+
+    promotion = None
+    if ('=' in san):
+        san, letter = san.split('=', 1)
+        promotion = san_names.get(letter[:1])
+    elif (len(san) > 2 and san[-1] in san_names and san[-2].isdigit()): # promotions are sometimes written without the =
+        san, promotion = san[:-1], san_names[san[-1]]
+    name = san_names[san[0]] if san[:1] in san_names else "Pawn"
+    squares = san[1:] if name != "Pawn" else san
+    squares = squares.replace('x', '').replace('-', '')
+    if (len(squares) < 2 or squares[-2] not in col_letters or not squares[-1].isdigit()):
+        return None
+    end_col = col_letters.index(squares[-2])
+    end_row = int(squares[-1]) - 1
+    start_cols = [col_letters.index(char) for char in squares[:-2] if char in col_letters]
+    start_rows = [int(char) - 1 for char in squares[:-2] if char.isdigit()]
+
+    moves = []
+    for move in game.get_legal_moves():
+        if ((move.end_row, move.end_col) != (end_row, end_col) or (start_cols and move.start_col != start_cols[0]) or (start_rows and move.start_row != start_rows[0])):
+            continue
+        if (name == "Pawn"):
+            if (is_pawn_move(move) and move.is_promotion == (promotion != None) and (promotion == None or move.piece_name == promotion)):
+                moves.append(move)
+        elif (move.piece_name == name and not move.is_promotion):
+            moves.append(move)
+    return moves[0] if len(moves) == 1 else None
+
+def movetext_tokens(text): # the moves and result of pgn movetext, without the move numbers, comments, variations and annotations
+    tokens = []
+    depth = 0 # how deep inside parenthesized variations the text is
+    i = 0
+    while (i < len(text)):
+        char = text[i]
+        if (char == '{'): # comments run to the closing brace
+            end = text.find('}', i)
+            i = len(text) if end == -1 else end + 1
+            continue
+        if (char == ';'): # and to the end of the line
+            end = text.find('\n', i)
+            i = len(text) if end == -1 else end + 1
+            continue
+        if (char == '('):
+            depth += 1
+        elif (char == ')'):
+            depth -= 1
+        elif (not char.isspace()):
+            end = i
+            while (end < len(text) and not text[end].isspace() and text[end] not in '{;()'):
+                end += 1
+            token = text[i:end]
+            i = end
+            if (depth == 0 and not token.startswith('$')):
+                token = token.rsplit('.', 1)[-1] # drops move numbers, including ones stuck to the move like 1.e4 or 3...Nf6
+                if (token != ''):
+                    tokens.append(token)
+            continue
+        i += 1
+    return tokens
+
+def in_comment_after(line, in_comment): # whether a brace comment is still open at the end of the line, comments don't nest
+    for char in line:
+        if (char == ('}' if in_comment else '{')):
+            in_comment = not in_comment
+        elif (char == ';' and not in_comment): # the rest of the line is a comment
+            break
+    return in_comment
+
+def replay_pgn(headers, movetext): # the game that a pgn record describes, or None if one of its moves can't be played
+    game = Game(fen = headers.get('FEN'))
+    for token in movetext_tokens(movetext):
+        if (token in results):
+            break
+        move = from_san(game, token)
+        if (move == None):
+            print('could not read pgn move ' + token + ' in ' + game.get_fen())
+            return None
+        game.do_move(move)
+    return game
+
+def read_pgn(path):
+    # generates (headers, game) for each game of a pgn file, reading only one game of the file at a time
+    headers = {}
+    movetext = []
+    in_comment = False # a line starting with [ inside a multi line comment isn't a tag
+    with open(path) as file:
+        for line in file:
+            stripped = line.strip()
+            if (stripped.startswith('[') and stripped.endswith(']') and not in_comment):
+                if (movetext): # a tag after movetext starts the next game
+                    game = replay_pgn(headers, ''.join(movetext))
+                    if (game != None):
+                        yield headers, game
+                    headers = {}
+                    movetext = []
+                tag, _, value = stripped[1:-1].partition(' ')
+                headers[tag] = value.strip().strip('"')
+            elif (stripped != '' or movetext):
+                movetext.append(line)
+                in_comment = in_comment_after(line, in_comment)
+    if (movetext or headers):
+        game = replay_pgn(headers, ''.join(movetext))
+        if (game != None):
+            yield headers, game
+
+def read_uci(path):
+    # generates (headers, game) for each line of a uci record file, the headers only have the Result and, if it isn't the initial position, the FEN
+    # lines that can't be read or have an illegal move are skipped
+    with open(path) as file:
+        for line in file:
+            fields = line.rstrip('\n').split('\t')
+            if (len(fields) != 3):
+                continue
+            result, fen, moves = fields
+            headers = {'Result': result}
+            if (fen != 'startpos'):
+                headers['FEN'] = fen
+            game = Game(fen = headers.get('FEN'))
+            moves = moves.split()
+            if (game.replay(moves) == len(moves)):
+                yield headers, game
+
+
+class GameRecordWriter:
+    def __init__(self, path, format = 'pgn', event = 'Self-play'): # format is 'pgn' or 'uci', games are appended to the file at path
+        if (format not in ['pgn', 'uci']):
+            print('unknown game record format ' + str(format) + ', writing pgn')
+            format = 'pgn'
+        self.format = format
+        self.event = event
+        self.num_games = 0
+        self.file = open(path, 'a')
+
+    def write_game(self, game, white = '?', black = '?', result = None): # result defaults to the result of the game's final position
+        if (result == None):
+            result = game_result(game)
+        moves = game.get_move_history()
+        if (self.format == 'uci'):
+            fen = 'startpos' if game.start_fen == start_fen else game.start_fen
+            self.file.write(result + '\t' + fen + '\t' + ' '.join(move.uci() for move in moves) + '\n')
+        else:
+            self.file.write(self.pgn(game.start_fen, moves, white, black, result))
+        self.file.flush() # so the games written so far survive the run being stopped
+        self.num_games += 1
+
+    def pgn(self, fen, moves, white, black, result):
+        headers = [('Event', self.event), ('Site', '?'), ('Date', time.strftime('%Y.%m.%d')), ('Round', str(self.num_games + 1)),
+                   ('White', white), ('Black', black), ('Result', result)]
+        if (fen != start_fen):
+            headers += [('SetUp', '1'), ('FEN', fen)]
+        lines = ['[' + tag + ' "' + value + '"]' for tag, value in headers]
+        lines.append('')
+
+        # the game is replayed from its start to write the moves in san
+        game = Game(fen = fen)
+        tokens = []
+        for move in moves:
+            total_moves = game.board.total_moves
+            if (total_moves % 2 == 0):
+                tokens.append(str((total_moves // 2) + 1) + '.')
+            elif (len(tokens) == 0):
+                tokens.append(str((total_moves // 2) + 1) + '...')
+            tokens.append(play_san(game, move))
+        tokens.append(result)
+
+        line = ''
+        for token in tokens: # pgn movetext lines are kept under 80 characters
+            if (len(line) + len(token) + 1 > 79):
+                lines.append(line)
+                line = token
+            else:
+                line = token if line == '' else line + ' ' + token
+        lines.append(line)
+        return '\n'.join(lines) + '\n\n'
+
+    def close(self):
+        self.file.close()
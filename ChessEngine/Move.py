@@ -1,7 +1,28 @@
 
+import numpy as np
+
 # this class essentially serves as a data structure with some extra functionality
+# a move is made for every possible move of every piece that regenerates, so it uses __slots__ instead of an attribute dict,
+# and it can be packed into a single int (see pack and unpack_move) for storing long lists of moves cheaply
+
+# the piece names are stored in packed moves as their index in this list, with 0 meaning no piece
+packed_names = [None, "Pawn", "Knight", "Bishop", "Rook", "Queen", "King"]
+packed_name_ids = {None: 0, "Pawn": 1, "Knight": 2, "Bishop": 3, "Rook": 4, "Queen": 5, "King": 6}
+
+# bit layout of a packed move
+START_SHIFT = 0 # 6 bits, start square (row * 8) + col
+END_SHIFT = 6 # 6 bits, end square
+PIECE_SHIFT = 12 # 3 bits, piece_name
+CAPTURE_SHIFT = 15 # 3 bits, capture_name
+PROMOTION_FLAG = 1 << 18
+EP_FLAG = 1 << 19
+QS_CASTLE_FLAG = 1 << 20
+KS_CASTLE_FLAG = 1 << 21
 
 class Move:
+    __slots__ = ('start_row', 'start_col', 'end_row', 'end_col', 'piece_name', 'is_capture', 'capture_name', 'capture_id',
+                 'is_promotion', 'is_ep', 'is_qs_castle', 'is_ks_castle', 'nnet_index', 'nnet_team')
+
     def __init__(self, start_row, start_col, end_row, end_col, piece_name, is_capture = False, capture_name = None, capture_id = -1, is_promotion = False, is_ep = False, is_qs_castle = False, is_ks_castle = False):
         self.start_row = start_row
         self.start_col = start_col
@@ -15,38 +36,62 @@ class Move:
         self.is_ep = is_ep
         self.is_qs_castle = is_qs_castle
         self.is_ks_castle = is_ks_castle
+        # the policy index is cached the first time it is asked for, along with the team it was asked for
+        self.nnet_index = -1
+        self.nnet_team = None
 
 
     def __str__(self):
         A = 97
         return (chr(self.start_col + A) + str(self.start_row + 1) + chr(self.end_col + A) + str(self.end_row + 1))
 
+    def uci(self): # the move in uci notation, which unlike str(move) names the piece a pawn promotes to
+        if (self.is_promotion):
+            return str(self) + uci_promotion_letters[self.piece_name]
+        return str(self)
+
+    def pack(self): # everything but capture_id, which only means something to the board that made the move
+        code = (((self.start_row * 8) + self.start_col) << START_SHIFT) | (((self.end_row * 8) + self.end_col) << END_SHIFT)
+        code |= (packed_name_ids[self.piece_name] << PIECE_SHIFT) | (packed_name_ids[self.capture_name] << CAPTURE_SHIFT)
+        if (self.is_promotion):
+            code |= PROMOTION_FLAG
+        if (self.is_ep):
+            code |= EP_FLAG
+        if (self.is_qs_castle):
+            code |= QS_CASTLE_FLAG
+        if (self.is_ks_castle):
+            code |= KS_CASTLE_FLAG
+        return code
+
     def get_nnet_index(self, team):
-        start_row = self.start_row
-        start_col = self.start_col
-        end_row = self.end_row
-        end_col = self.end_col
-
-        if (not team): # the moves, like the board need to be oriented all the same way for the nnet input
-            start_row = 7 - start_row
-            end_row = 7 - end_row
-        
-        if (not self.is_promotion):
-            code = encode(start_row, start_col, end_row, end_col)
-        else:
-            direction = end_col - start_col
-            code = encode(start_row, start_col, end_row, end_col, is_promotion = True, end_piece = self.piece_name, direction = direction)
-            
-        if (code == -1):
-            print('Critical error: move encoding failed!')
-        if code in nnet_ids:
-            index = nnet_ids[code]
-            return index
-        else:
-            print('Critical error: code ' + str(code) + ' not found for move ' + str(self) + str(self.piece_name))
-            return -1
-        
+        if (self.nnet_team is not team):
+            promotion = promotion_ids[self.piece_name] if self.is_promotion else 0
+            self.nnet_index = policy_indices[policy_key((self.start_row * 8) + self.start_col, (self.end_row * 8) + self.end_col, promotion, team)]
+            self.nnet_team = team
+            if (self.nnet_index == -1):
+                print('Critical error: no policy index for move ' + str(self) + str(self.piece_name))
+        return self.nnet_index
+
 
+def unpack_move(code):
+    start_sq = (code >> START_SHIFT) & 63
+    end_sq = (code >> END_SHIFT) & 63
+    capture_name = packed_names[(code >> CAPTURE_SHIFT) & 7]
+    return Move(start_sq // 8, start_sq % 8, end_sq // 8, end_sq % 8, packed_names[(code >> PIECE_SHIFT) & 7], is_capture = (capture_name != None),
+                capture_name = capture_name, is_promotion = bool(code & PROMOTION_FLAG), is_ep = bool(code & EP_FLAG),
+                is_qs_castle = bool(code & QS_CASTLE_FLAG), is_ks_castle = bool(code & KS_CASTLE_FLAG))
+
+uci_promotion_names = {'q': "Queen", 'n': "Knight", 'b': "Bishop", 'r': "Rook"}
+uci_promotion_letters = {"Queen": 'q', "Knight": 'n', "Bishop": 'b', "Rook": 'r'}
+
+def parse_uci(str_move): # returns (start square, end square, promotion name or None) for a move like e2e4 or e7e8q, or None if it isn't one
+    if (len(str_move) not in [4, 5] or (len(str_move) == 5 and str_move[4] not in uci_promotion_names)):
+        return None
+    cols = [ord(str_move[0]) - 97, ord(str_move[2]) - 97]
+    rows = [ord(str_move[1]) - 49, ord(str_move[3]) - 49]
+    if (not all(0 <= i <= 7 for i in cols + rows)):
+        return None
+    return (rows[0] * 8) + cols[0], (rows[1] * 8) + cols[1], (uci_promotion_names[str_move[4]] if len(str_move) == 5 else None)
 
 def encode(row_1, col_1, row_2, col_2, is_promotion = False, end_piece = "Queen", direction = 0):
     if ((0 <= row_1 <= 7) and (0 <= col_1 <= 7) and (0 <= row_2 <= 7) and (0 <= col_2 <= 7)):
@@ -114,3 +159,49 @@ for row in range(8):
                     
 #print(count)
 #print(len(nnet_ids))
+
+# the nnet_ids dict is flattened into direct lookup tables so a move never has to be encoded to find its policy index.
+# promotions are numbered 0 for no promotion (or a queen, which moves like any other piece), 1 knight, 2 bishop and 3 rook
+num_policy_moves = count
+promotion_ids = {"Queen": 0, "Knight": 1, "Bishop": 2, "Rook": 3}
+promotion_names = ["Queen", "Knight", "Bishop", "Rook"]
+
+def policy_key(start_sq, end_sq, promotion, team): # the index into policy_indices
+    return ((((0 if team else 1) * 64 + start_sq) * 64) + end_sq) * 4 + promotion
+
+# policy_indices[policy_key(...)] is the policy index of a move, or -1 if no such move exists
+# policy_start_squares[team_index][i], policy_end_squares and policy_promotions go the other way, from policy index i back to
+# a move for the team (index 0 white, 1 black), with -1 squares for the indices of moves that would leave the board
+policy_indices = [-1] * (2 * 64 * 64 * 4)
+policy_start_squares = np.full([2, num_policy_moves], -1, np.dtype(int))
+policy_end_squares = np.full([2, num_policy_moves], -1, np.dtype(int))
+policy_promotions = np.zeros([2, num_policy_moves], np.dtype(int))
+for start_sq in range(64):
+    for end_sq in range(64):
+        for promotion in range(4):
+            row_1, col_1 = divmod(start_sq, 8)
+            row_2, col_2 = divmod(end_sq, 8)
+            code = encode(row_1, col_1, row_2, col_2, is_promotion = (promotion != 0), end_piece = promotion_names[promotion], direction = col_2 - col_1)
+            if (code in nnet_ids and (promotion == 0 or row_2 == row_1 + 1)):
+                index = nnet_ids[code]
+                for team_index in range(2):
+                    # the moves are oriented for the player moving, so black's moves are flipped vertically
+                    flip = 0 if team_index == 0 else 56
+                    policy_indices[policy_key(start_sq ^ flip, end_sq ^ flip, promotion, team_index == 0)] = index
+                    policy_start_squares[team_index][index] = start_sq ^ flip
+                    policy_end_squares[team_index][index] = end_sq ^ flip
+                    policy_promotions[team_index][index] = promotion
+
+def decode_nnet_index(index, team): # the inverse of get_nnet_index, returns (start square, end square, promotion name or None)
+    team_index = 0 if team else 1
+    promotion = policy_promotions[team_index][index]
+    return int(policy_start_squares[team_index][index]), int(policy_end_squares[team_index][index]), (promotion_names[promotion] if promotion != 0 else None)
+
+def get_nnet_indices(moves, team): # the policy indices of a list of moves as an array, for gathering their values out of a policy
+    return np.fromiter((move.get_nnet_index(team) for move in moves), np.dtype(int), len(moves))
+
+def rank_moves(policy, moves, team):
+    # returns the moves sorted from most to least likely according to the policy, along with their policy values
+    values = policy[get_nnet_indices(moves, team)]
+    order = np.argsort(-values, kind = 'stable')
+    return [moves[i] for i in order], values[order]
@@ -0,0 +1,29 @@
+from collections import OrderedDict
+
+# Boards only generate the legal moves of a position the first time they are asked for, and keep the lists in a bounded
+# least recently used cache keyed by the position's zobrist hash. A position that is reached again, after undoing back up the
+# search tree or through a transposition, gets its list back without any move generation.
+
+default_cache_size = 4096
+
+class MoveCache:
+    def __init__(self, max_size = default_cache_size):
+        self.max_size = max_size
+        self.entries = OrderedDict() # board hash -> legal move list, oldest first
+
+    def get(self, board_hash): # returns None if the position isn't cached
+        moves = self.entries.get(board_hash)
+        if (moves != None):
+            self.entries.move_to_end(board_hash)
+        return moves
+
+    def put(self, board_hash, moves):
+        self.entries[board_hash] = moves
+        if (len(self.entries) > self.max_size):
+            self.entries.popitem(last = False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,135 @@
+import sys, time, argparse
+from multiprocessing import Pool
+from BoardState import Board
+from BitBoard import BitBoard
+from Fen import start_fen
+
+# perft counts every sequence of legal moves to a fixed depth, which makes it both a check of move generation
+# (the counts of well known positions are published) and a benchmark of do_move, undo_move and legal move generation
+
+# the suite positions are given as fen strings, with the expected node count at each depth starting from depth 1
+perft_positions = [
+    ("initial position", start_fen, [20, 400, 8902, 197281, 4865609]),
+    # the well known "kiwipete" position
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("en passant", "rnbqkbnr/1pp1pppp/p7/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3", [31, 781, 24166, 630536]),
+    ("promotion", "r2qkbnr/1Ppppppp/2n5/8/8/8/1PPPPPPP/RNBQKBNR w KQkq - 1 5", [33, 890, 28808, 775934]),
+    ("evans gambit", "r1b1k2r/ppppnppp/2n3q1/b3P3/2B5/1QN2N2/P4PPP/R1B2RK1 w kq - 1 11", [47, 1836, 84647, 3360931]),
+    # the rest of the standard perft test positions, which cover en passant discovered checks, promotions and castling out of check
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("position 4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1", [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890, 3894594]),
+]
+
+def make_board(fen = start_fen, moves = [], bitboard = False): # the position of the fen string after playing moves from it
+    board = BitBoard(fen = fen) if bitboard else Board(fen = fen)
+    for str_move in moves:
+        if (board.do_str_move(str_move) == None):
+            print('could not play ' + str_move)
+    return board
+
+def perft(board, depth, cache = None): # cache is an optional dict of (board hash, depth) -> node count
+    if (depth == 0):
+        return 1
+    moves = board.get_moves_from_state()
+    if (depth == 1): # bulk counting, the leaf moves never need to be made
+        return len(moves)
+
+    if (cache is not None):
+        key = (board.get_board_hash(), depth)
+        if (key in cache):
+            return cache[key]
+
+    nodes = 0
+    for move in moves:
+        undo_info = board.do_move(move)
+        nodes += perft(board, depth - 1, cache)
+        board.undo_move(*undo_info)
+
+    if (cache is not None):
+        cache[key] = nodes
+    return nodes
+
+def divide(board, depth, cache = None): # the node count below each root move, for finding where move generation goes wrong
+    results = []
+    for move in board.get_moves_from_state():
+        undo_info = board.do_move(move)
+        results.append((move.uci(), perft(board, depth - 1, cache)))
+        board.undo_move(*undo_info)
+    return results
+
+def divide_worker(args):
+    fen, moves, move_index, depth, bitboard, use_cache = args
+    board = make_board(fen, moves, bitboard)
+    move = board.get_moves_from_state()[move_index] # every worker sets up the same position, so the move lists come out in the same order
+    board.do_move(move)
+    return perft(board, depth - 1, {} if use_cache else None)
+
+def parallel_divide(fen, moves, depth, bitboard = False, use_cache = False, processes = None):
+    # splits the root moves of the position reached by playing moves from the fen over a pool of processes
+    board = make_board(fen, moves, bitboard)
+    root_moves = board.get_moves_from_state()
+    jobs = [(fen, moves, i, depth, bitboard, use_cache) for i in range(len(root_moves))]
+    with Pool(processes) as pool:
+        counts = pool.map(divide_worker, jobs)
+    return [(root_moves[i].uci(), counts[i]) for i in range(len(root_moves))]
+
+def run_perft(fen, moves, depth, bitboard = False, use_cache = False, processes = 1):
+    # returns the node count, the time taken and the nodes per second
+    start = time.perf_counter()
+    if (processes == 1 or depth < 2):
+        nodes = perft(make_board(fen, moves, bitboard), depth, {} if use_cache else None)
+    else:
+        nodes = sum(count for name, count in parallel_divide(fen, moves, depth, bitboard, use_cache, processes))
+    elapsed = time.perf_counter() - start
+    return nodes, elapsed, (nodes / elapsed if elapsed > 0 else 0)
+
+def run_suite(max_depth, bitboard = False, use_cache = False, processes = 1, positions = perft_positions):
+    all_passed = True
+    for name, fen, expected_counts in positions:
+        print(name)
+        for depth in range(1, min(max_depth, len(expected_counts)) + 1):
+            nodes, elapsed, nps = run_perft(fen, [], depth, bitboard, use_cache, processes)
+            passed = (nodes == expected_counts[depth - 1])
+            all_passed = all_passed and passed
+            print('  depth ' + str(depth) + ': ' + str(nodes) + ' nodes' + ('' if passed else ' FAILED, expected ' + str(expected_counts[depth - 1]))
+                  + ' in ' + str(round(elapsed, 3)) + 's (' + str(int(nps)) + ' nodes/s)')
+    return all_passed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'perft node counts for checking and timing move generation')
+    parser.add_argument('depth', type = int, help = 'depth to search to')
+    parser.add_argument('--position', help = 'name of a suite position, by default the whole suite is run')
+    parser.add_argument('--fen', help = 'fen of the position to count, instead of a suite position')
+    parser.add_argument('--moves', nargs = '*', help = 'moves played from the starting position (or the fen) to the position to count')
+    parser.add_argument('--divide', action = 'store_true', help = 'print the node count below each root move')
+    parser.add_argument('--bitboard', action = 'store_true', help = 'use the bitboard backend instead of Board')
+    parser.add_argument('--cache', action = 'store_true', help = 'cache node counts by board hash and depth')
+    parser.add_argument('--processes', type = int, default = 1, help = 'number of processes to split the root moves over')
+    args = parser.parse_args()
+
+    positions = perft_positions
+    if (args.position is not None):
+        positions = [position for position in perft_positions if position[0] == args.position]
+    elif (args.fen is not None or args.moves is not None):
+        positions = [("custom position", start_fen if args.fen is None else args.fen, [])]
+    moves = [] if args.moves is None else args.moves
+
+    if (args.divide or args.fen is not None or args.moves is not None):
+        for name, fen, expected_counts in positions:
+            if (args.divide):
+                if (args.processes == 1):
+                    results = divide(make_board(fen, moves, args.bitboard), args.depth, {} if args.cache else None)
+                else:
+                    results = parallel_divide(fen, moves, args.depth, args.bitboard, args.cache, args.processes)
+                for str_move, count in results:
+                    print(str_move + ': ' + str(count))
+                print('total: ' + str(sum(count for str_move, count in results)))
+            else:
+                nodes, elapsed, nps = run_perft(fen, moves, args.depth, args.bitboard, args.cache, args.processes)
+                print(str(nodes) + ' nodes in ' + str(round(elapsed, 3)) + 's (' + str(int(nps)) + ' nodes/s)')
+    else:
+        sys.exit(0 if run_suite(args.depth, args.bitboard, args.cache, args.processes, positions) else 1)
@@ -1,7 +1,21 @@
-import numpy as np
 from Move import Move
 
+def move_squares(move): # the mask of the squares whose contents change when the move is made, which pieces depending on them need to see
+    squares = (1 << ((move.start_row * 8) + move.start_col)) | (1 << ((move.end_row * 8) + move.end_col))
+    if (move.is_qs_castle): # the rook's squares, and the square between the rook and where the king lands
+        squares |= 0b1011 << ((move.end_row * 8) + move.end_col - 2)
+    elif (move.is_ks_castle):
+        squares |= 0b101 << ((move.end_row * 8) + move.end_col - 1)
+    elif (move.is_ep): # the captured pawn is beside the pawn that captures it
+        squares |= 1 << ((move.start_row * 8) + move.end_col)
+    return squares
+
 class Piece:
+    # slots keep every piece small and make attribute access faster. every subclass shares this one slot layout (the pawn and king
+    # attributes included) and keeps its name as a class attribute, so a pawn can promote by changing its __class__ in place
+    __slots__ = ('row', 'col', 'piece_id', 'team', 'possible_moves', 'alive', 'dependent_squares', 'attacked_squares',
+                 'start_row', 'direction', 'can_castle_queenside', 'can_castle_kingside')
+
     def __init__(self, row, col, team, piece_id):
         # row and col are integers 0 through 7 inclusive
         self.row = row
@@ -15,13 +29,15 @@ class Piece:
         self.possible_moves = []
         # alive is used by the board to determine if it should consider any actions with this piece
         self.alive = True
-        # dependent_on_square keeps track of the squares where this piece's
-        # available moves are dependent on
-        self.dependent_on_square = np.zeros([8,8], np.dtype(bool))
+        # dependent_squares is a 64 bit mask (bit (row * 8) + col) of the squares
+        # this piece's available moves are dependent on
+        self.dependent_squares = 0
+        # attacked_squares is the mask of squares this piece is counted as attacking in the board's attack counts, if it keeps them
+        self.attacked_squares = 0
 
     def can_move_to(self, end_row, end_col, board):
         if (end_row >= 0 and end_row < board.num_rows and end_col >= 0 and end_col < board.num_cols):
-            self.dependent_on_square[end_row][end_col] = True
+            self.dependent_squares |= 1 << ((end_row * 8) + end_col)
             check_piece = board.get_piece_at(end_row, end_col)
             if (check_piece == None): # means the square is empty, so yes the piece can move there
                 self.possible_moves.append(Move(self.row, self.col, end_row, end_col, self.name))
@@ -32,17 +48,6 @@ class Piece:
         else: # means either the desired square is occupied by a friendly piece or the index is out of bounds
             return False
 
-    def dependent_on_move(self, move):
-        end_dependent = self.dependent_on_square[move.end_row][move.end_col]
-        if (move.is_qs_castle):
-            end_dependent = end_dependent or self.dependent_on_square[move.end_row][move.end_col + 1] or self.dependent_on_square[move.end_row][move.end_col - 1] or self.dependent_on_square[move.end_row][move.end_col - 2]
-        if (move.is_ks_castle):
-            end_dependent = end_dependent or self.dependent_on_square[move.end_row][move.end_col - 1] or self.dependent_on_square[move.end_row][move.end_col + 1]
-            
-        start_dependent = self.dependent_on_square[move.start_row][move.start_col]
-        capture_dependent = move.is_ep and self.dependent_on_square[move.start_row][move.end_col]
-        return (start_dependent or end_dependent or capture_dependent)
-
     def __str__(self):
         return (('w' if self.team else 'b') + self.name[0:2])
 
@@ -50,9 +55,11 @@ class Piece:
 promotion_names = ["Queen", "Knight", "Rook", "Bishop"]
 
 class Pawn(Piece):
+    __slots__ = ()
+    name = "Pawn"
+
     def __init__(self, row, col, team, piece_id):
         super().__init__(row, col, team, piece_id)
-        self.name = "Pawn"
         # the following condition initializes values for pawn movement, since they can only move in one direction from where they begin
         if (team): # true if on white team
             self.start_row = 1
@@ -61,8 +68,8 @@ class Pawn(Piece):
             self.start_row = 6
             self.direction = -1
 
-    def gen_moves(self, board, latest_move, is_undo = False): # returns a Piece object, in most situations it will be this pawn, but in the case of a promotion it may not be
-        self.dependent_on_square = np.zeros([8,8], np.dtype(bool))
+    def gen_moves(self, board, latest_move, is_undo = False):
+        self.dependent_squares = 0
         self.possible_moves = []
         signs = [-1, 0, 1]
 
@@ -72,40 +79,21 @@ class Pawn(Piece):
             lm_start_pos = (latest_move.start_row, latest_move.start_col)
             lm_end_pos = (latest_move.end_row, latest_move.end_col)
 
-            if (is_undo and my_pos == lm_end_pos and not self.piece_id == latest_move.capture_id):
+            if (is_undo and my_pos == lm_end_pos and board.get_piece_at(lm_start_pos[0], lm_start_pos[1]) is self): # the captured piece is revived on the end square too
                 self.row, self.col = lm_start_pos
 
         if (latest_move != None and not is_undo and lm_start_pos == my_pos): # means this piece moved on the latest move
             self.row, self.col = lm_end_pos
-            
-            if (latest_move.is_promotion):
-                #print('promoting pawn')
-                if (latest_move.piece_name == "Queen"):
-                    new_piece = Queen(self.row, self.col, self.team, self.piece_id)
-                elif (latest_move.piece_name == "Knight"):
-                    new_piece = Knight(self.row, self.col, self.team, self.piece_id)
-                elif (latest_move.piece_name == "Rook"):
-                    new_piece = Rook(self.row, self.col, self.team, self.piece_id)
-                elif (latest_move.piece_name == "Bishop"):
-                    new_piece = Bishop(self.row, self.col, self.team, self.piece_id)
-                else: # this should never be reached, but if for whatever reason it is, we will default the promotion to a queen
-                    new_piece = Queen(self.row, self.col, self.team, self.piece_id)
-                    
-                new_piece.gen_moves(board, None)
-                return new_piece
-
-        self.dependent_on_square[self.row][self.col] = True
+
+        self.dependent_squares |= 1 << ((self.row * 8) + self.col)
         end_row = self.row + self.direction
         for sign in signs: # checks if it can move forward, forward left, or forward right
             end_col = self.col + sign
             self.can_move_to(end_row, end_col, board)
         if (self.row == self.start_row): # checks if it is on the starting rank, and if it is, checks if it can move forward twice
             self.can_move_to(self.row + (2 * self.direction), self.col, board)
-        if (self.row == (self.start_row + (3 * self.direction))): # checks if it is on a potential en passant row, and sets dependencies to its left and right if it is
-            if (self.col - 1 >= 0):
-                self.dependent_on_square[self.row][self.col - 1] = True
-            if (self.col + 1 < board.num_cols):
-                self.dependent_on_square[self.row][self.col + 1] = True
+        # en passant captures are not generated here, since they depend on the last move rather than on any square.
+        # the board adds them when it generates the legal moves, see Board.gen_en_passant_moves
             
         return self
 
@@ -113,7 +101,7 @@ class Pawn(Piece):
 
     def can_move_to(self, end_row, end_col, board):
         if (end_row >= 0 and end_row < board.num_rows and end_col >= 0 and end_col < board.num_cols):
-            self.dependent_on_square[end_row][end_col] = True
+            self.dependent_squares |= 1 << ((end_row * 8) + end_col)
             check_piece = board.get_piece_at(end_row, end_col)
 
             if (self.col == end_col and check_piece == None): # moving forwards to an empty square
@@ -138,22 +126,16 @@ class Pawn(Piece):
                     else: # good old fashioned regular diagonal capture
                         self.possible_moves.append(Move(self.row, self.col, end_row, end_col, self.name, is_capture = True, capture_name = check_piece.name, capture_id = check_piece.piece_id))
                         return True
-                elif (end_col == board.en_passant_col and self.row == (self.start_row + (3 * self.direction))): # capturing en passant
-                    check_piece = board.get_piece_at(self.row, end_col)
-                    if (check_piece != None and check_piece.team != self.team and check_piece.name == "Pawn"):
-                        self.possible_moves.append(Move(self.row, self.col, end_row, end_col, self.name, is_capture = True, capture_name = check_piece.name, capture_id = check_piece.piece_id, is_ep = True))
-                        return True
                 
         return False
 
 
 class Queen(Piece):
-    def __init__(self, row, col, team, piece_id):
-        super().__init__(row, col, team, piece_id)
-        self.name = "Queen"
+    __slots__ = ()
+    name = "Queen"
 
     def gen_moves(self, board, latest_move, is_undo = False):
-        self.dependent_on_square = np.zeros([8,8], np.dtype(bool))
+        self.dependent_squares = 0
         self.possible_moves = []
         signs = [-1, 0, 1]
 
@@ -163,12 +145,12 @@ class Queen(Piece):
             lm_start_pos = (latest_move.start_row, latest_move.start_col)
             lm_end_pos = (latest_move.end_row, latest_move.end_col)
 
-            if (is_undo and my_pos == lm_end_pos and not self.piece_id == latest_move.capture_id):
+            if (is_undo and my_pos == lm_end_pos and board.get_piece_at(lm_start_pos[0], lm_start_pos[1]) is self): # the captured piece is revived on the end square too
                 self.row, self.col = lm_start_pos
             elif (not is_undo and my_pos == lm_start_pos):
                 self.row, self.col = lm_end_pos
 
-        self.dependent_on_square[self.row][self.col] = True
+        self.dependent_squares |= 1 << ((self.row * 8) + self.col)
         for x_sign in signs:
             for y_sign in signs:
                 if (not(x_sign == 0 and y_sign == 0)):
@@ -192,12 +174,11 @@ class Queen(Piece):
 
 
 class Rook(Piece):
-    def __init__(self, row, col, team, piece_id):
-        super().__init__(row, col, team, piece_id)
-        self.name = "Rook"
+    __slots__ = ()
+    name = "Rook"
 
     def gen_moves(self, board, latest_move, is_undo = False):
-        self.dependent_on_square = np.zeros([8,8], np.dtype(bool))
+        self.dependent_squares = 0
         self.possible_moves = []
         signs = [-1, 0, 1]
 
@@ -207,12 +188,12 @@ class Rook(Piece):
             lm_start_pos = (latest_move.start_row, latest_move.start_col)
             lm_end_pos = (latest_move.end_row, latest_move.end_col)
 
-            if (is_undo and my_pos == lm_end_pos and not self.piece_id == latest_move.capture_id):
+            if (is_undo and my_pos == lm_end_pos and board.get_piece_at(lm_start_pos[0], lm_start_pos[1]) is self): # the captured piece is revived on the end square too
                 self.row, self.col = lm_start_pos
             elif (not is_undo and my_pos == lm_start_pos):
                 self.row, self.col = lm_end_pos
 
-        self.dependent_on_square[self.row][self.col] = True
+        self.dependent_squares |= 1 << ((self.row * 8) + self.col)
         for x_sign in signs:
             for y_sign in signs:
                 if (x_sign * y_sign == 0 and x_sign + y_sign != 0):
@@ -236,12 +217,11 @@ class Rook(Piece):
 
 
 class Bishop(Piece):
-    def __init__(self, row, col, team, piece_id):
-        super().__init__(row, col, team, piece_id)
-        self.name = "Bishop"
+    __slots__ = ()
+    name = "Bishop"
 
     def gen_moves(self, board, latest_move, is_undo = False):
-        self.dependent_on_square = np.zeros([8,8], np.dtype(bool))
+        self.dependent_squares = 0
         self.possible_moves = []
         signs = [-1, 1]
 
@@ -251,12 +231,12 @@ class Bishop(Piece):
             lm_start_pos = (latest_move.start_row, latest_move.start_col)
             lm_end_pos = (latest_move.end_row, latest_move.end_col)
 
-            if (is_undo and my_pos == lm_end_pos and not self.piece_id == latest_move.capture_id):
+            if (is_undo and my_pos == lm_end_pos and board.get_piece_at(lm_start_pos[0], lm_start_pos[1]) is self): # the captured piece is revived on the end square too
                 self.row, self.col = lm_start_pos
             elif (not is_undo and my_pos == lm_start_pos):
                 self.row, self.col = lm_end_pos
 
-        self.dependent_on_square[self.row][self.col] = True
+        self.dependent_squares |= 1 << ((self.row * 8) + self.col)
         for x_sign in signs:
             for y_sign in signs:
                 magnitude = 1
@@ -279,12 +259,11 @@ class Bishop(Piece):
 
 
 class Knight(Piece):
-    def __init__(self, row, col, team, piece_id):
-        super().__init__(row, col, team, piece_id)
-        self.name = "Knight"
+    __slots__ = ()
+    name = "Knight"
 
     def gen_moves(self, board, latest_move, is_undo = False):
-        self.dependent_on_square = np.zeros([8,8], np.dtype(bool))
+        self.dependent_squares = 0
         self.possible_moves = []
         signs = [-2, -1, 1, 2]
 
@@ -294,12 +273,12 @@ class Knight(Piece):
             lm_start_pos = (latest_move.start_row, latest_move.start_col)
             lm_end_pos = (latest_move.end_row, latest_move.end_col)
 
-            if (is_undo and my_pos == lm_end_pos and not self.piece_id == latest_move.capture_id):
+            if (is_undo and my_pos == lm_end_pos and board.get_piece_at(lm_start_pos[0], lm_start_pos[1]) is self): # the captured piece is revived on the end square too
                 self.row, self.col = lm_start_pos
             elif (not is_undo and my_pos == lm_start_pos):
                 self.row, self.col = lm_end_pos
 
-        self.dependent_on_square[self.row][self.col] = True
+        self.dependent_squares |= 1 << ((self.row * 8) + self.col)
         for x_sign in signs:
             for y_sign in signs:
                 if (abs(x_sign * y_sign) == 2):
@@ -311,22 +290,18 @@ class Knight(Piece):
 
 
 class King(Piece):
+    __slots__ = ()
+    name = "King"
+
     def __init__(self, row, col, team, piece_id):
         super().__init__(row, col, team, piece_id)
-        self.name = "King"
+        # the castling rights are kept by the king, but the board takes them away and generates the castling moves,
+        # see Board.do_move and Board.gen_castling_moves
         self.can_castle_queenside = True
         self.can_castle_kingside = True
-        if (team):
-            self.start_pos = (0, 4)
-            self.queenside_rook_pos = (0, 0)
-            self.kingside_rook_pos = (0, 7)
-        else:
-            self.start_pos = (7, 4)
-            self.queenside_rook_pos = (7, 0)
-            self.kingside_rook_pos = (7, 7)
 
     def gen_moves(self, board, latest_move, is_undo = False):
-        self.dependent_on_square = np.zeros([8,8], np.dtype(bool))
+        self.dependent_squares = 0
         self.possible_moves = []
         signs = [-1, 0, 1]
 
@@ -336,12 +311,12 @@ class King(Piece):
             lm_start_pos = (latest_move.start_row, latest_move.start_col)
             lm_end_pos = (latest_move.end_row, latest_move.end_col)
 
-            if (is_undo and my_pos == lm_end_pos and not self.piece_id == latest_move.capture_id):
+            if (is_undo and my_pos == lm_end_pos and board.get_piece_at(lm_start_pos[0], lm_start_pos[1]) is self): # the captured piece is revived on the end square too
                 self.row, self.col = lm_start_pos
             elif (not is_undo and my_pos == lm_start_pos):
                 self.row, self.col = lm_end_pos
 
-        self.dependent_on_square[self.row][self.col] = True
+        self.dependent_squares |= 1 << ((self.row * 8) + self.col)
         # normal king movement in all 8 directions
         for x_sign in signs:
             for y_sign in signs:
@@ -349,124 +324,9 @@ class King(Piece):
                     test_row = self.row + y_sign
                     test_col = self.col + x_sign
                     self.can_move_to(test_row, test_col, board)
-                    
-        # removes castling rights if necessary
-        
-        if (latest_move != None and not is_undo):
-            if (lm_start_pos == self.start_pos or lm_end_pos == self.start_pos): # if the king moves you can't castle
-                self.can_castle_queenside = False
-                self.can_castle_kingside = False
-                #print(str(self) + 'lost castling because king moved')
-            if (self.can_castle_queenside and (lm_start_pos == self.queenside_rook_pos or lm_end_pos == self.queenside_rook_pos)): # if the queenside rook moves you can't castle queenside
-                self.can_castle_queenside = False
-                #print(str(self) + 'lost castling because queenside rook moved')
-            if (self.can_castle_kingside and (lm_start_pos == self.kingside_rook_pos or lm_end_pos == self.kingside_rook_pos)): # if the kingside rook moves you can't castle kingside
-                self.can_castle_kingside = False
-                #print(str(self) + 'lost castling because kingside rook moved')
-
-        # adds depedencies for castling as well as adding castling to the possible move list if applicable
-        # dependencies for castling shouldn't actually matter because if castling is a possibility then the king is updated after every move, but just in case
-        if (not self.is_in_check(board)):
-            if (self.can_castle_queenside):
-                self.dependent_on_square[self.queenside_rook_pos[0], self.queenside_rook_pos[1]] = True
-                original_col = self.col
-                clear_skies = True
-                for i in range(3):
-                    if (board.get_piece_at(self.row, self.col - 1) == None):
-                        if (i != 2): # the square the rook moves through can be 'in check' but it cannot be occupied
-                            self.col = self.col - 1
-                            if (self.is_in_check(board)):
-                                clear_skies = False
-                                i = 4
-                    else:
-                        clear_skies = False
-                        i = 4
-
-                self.col = original_col
-                if (clear_skies):
-                    self.possible_moves.append(Move(self.row, self.col, self.row, self.col - 2, "King", is_qs_castle = True))
-            if (self.can_castle_kingside):
-                self.dependent_on_square[self.kingside_rook_pos[0], self.kingside_rook_pos[1]] = True
-                original_col = self.col
-                clear_skies = True
-                for i in range(2):
-                    if (board.get_piece_at(self.row, self.col + 1) == None):
-                        self.col = self.col + 1
-                        if (self.is_in_check(board)):
-                            clear_skies = False
-                            i = 3
-                    else:
-                        clear_skies = False
-                        i = 3
-
-                self.col = original_col
-                if (clear_skies):
-                    self.possible_moves.append(Move(self.row, self.col, self.row, self.col + 2, "King", is_ks_castle = True))
-                
-        # tests if the king can safely occupy the squares he moves into the squares he would travel through while castling
-        
 
         return self
 
-    def dependent_on_move(self, move):
-        if (self.can_castle_queenside or self.can_castle_kingside):
-            return True # castling is not only dependent on the pieces in between, but also the pieces putting pressure on the squares in between. Therefore if castling is a possibility, the king is dependent
-                        # on every move that is made
-        else: # otherwise has the same dependencies as regular pieces
-            end_dependent = self.dependent_on_square[move.end_row][move.end_col]
-            start_dependent = self.dependent_on_square[move.start_row][move.start_col]
-            capture_dependent = move.is_ep and self.dependent_on_square[move.start_row][move.end_col]
-            return (start_dependent or end_dependent or capture_dependent)
-
-    def is_in_check(self, board): # to test this, we treat the king as some sort of queen-knight hybrid to see if he could capture anything
-        # this first loop checks for enemy queens, rooks, bishops, kings, or pawns
-        signs = [-1, 0, 1]
-        for x_sign in signs:
-            for y_sign in signs:
-                if (not(x_sign == 0 and y_sign == 0)):
-                    magnitude = 1
-                    has_los = True # los stands for line of sight
-
-                    while (has_los):
-                        test_row = self.row + (magnitude * y_sign)
-                        test_col = self.col + (magnitude * x_sign)
-
-                        is_bishop_movement = (abs(x_sign * y_sign) == 1)
-                        is_rook_movement = (x_sign * y_sign == 0)
-                        is_queen_movement = is_bishop_movement or is_rook_movement
-                        is_king_movement = (magnitude == 1 and is_queen_movement) # a king moves like a queen but with a magnitude of 1
-                        enemy_pawn_direction = 1 if self.team else -1 # not the direction the enemy pawn moves, but the direction from which the king would be able to view them
-                        is_pawn_movement = (magnitude == 1 and is_bishop_movement and y_sign == enemy_pawn_direction) # a pawn only exerts pressure diagonally, like a bishop, but also only in certain directions
-
-                        if (test_row >= 0 and test_row < board.num_rows and test_col >= 0 and test_col < board.num_cols):
-                            check_piece = board.get_piece_at(test_row, test_col)
-                            if (check_piece != None): # line of sight is lost after hitting any piece
-                                if (check_piece.team != self.team):
-                                    if (is_bishop_movement and check_piece.name == "Bishop"):
-                                        return True
-                                    elif (is_rook_movement and check_piece.name == "Rook"):
-                                        return True
-                                    elif (is_queen_movement and check_piece.name == "Queen"):
-                                        return True
-                                    elif (is_king_movement and check_piece.name == "King"):
-                                        return True
-                                    elif (is_pawn_movement and check_piece.name == "Pawn"):
-                                        return True
-                                    
-                                has_los = False
-                        else: # if the test position is out of bounds line of sight is certainly broken
-                            has_los = False
+    def is_in_check(self, board):
+        return board.is_square_attacked((self.row * 8) + self.col, not self.team)
 
-                        magnitude += 1
-        # this second loop checks for enemy knights
-        signs = [-2, -1, 1, 2]
-        for x_sign in signs:
-            for y_sign in signs:
-                if (abs(x_sign * y_sign) == 2):
-                    test_row = self.row + y_sign
-                    test_col = self.col + x_sign
-                    check_piece = board.get_piece_at(test_row, test_col)
-                    if (check_piece != None and check_piece.team != self.team and check_piece.name == "Knight"):
-                        return True
-
-        return False
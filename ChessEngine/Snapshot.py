@@ -0,0 +1,15 @@
+from collections import namedtuple
+
+# An immutable copy of a position made of flat tuples and ints, so it is cheap to make, pickle to another process or keep around,
+# and either board backend can be built from it. mailbox holds the piece code on each square, which is the piece type index
+# (Pawn 0, Knight 1, Bishop 2, Rook 3, Queen 4, King 5, the same order as the zobrist keys) plus 6 for black pieces, or -1 for
+# an empty square. bitboards has the 64 bit mask of the squares of each of the 12 piece codes.
+Snapshot = namedtuple('Snapshot', ['mailbox', 'bitboards', 'team_to_move', 'castling_flags', 'en_passant_col',
+                                   'moves_since_advancement', 'total_moves', 'board_hash'])
+
+def bitboards_from_mailbox(mailbox):
+    bitboards = [0] * 12
+    for sq in range(64):
+        if (mailbox[sq] != -1):
+            bitboards[mailbox[sq]] |= 1 << sq
+    return tuple(bitboards)
@@ -0,0 +1,504 @@
+import os, time, argparse
+import numpy as np
+from BitBoard import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY
+from AttackTables import knight_targets, king_targets, pawn_targets, between, is_rook_direction, ray_squares
+
+# Endgame tablebases: for every position of a small set of pieces (without castling rights or en passant), whether the team to move
+# wins, draws or loses with best play, and in how many plies the game ends in checkmate. Tables are generated by retrograde analysis:
+# every position is checked once for checkmate, stalemate and the results of its captures and promotions (which lead into the
+# tables of the material left after them), and then results are spread backwards from the checkmates one ply at a time by
+# unmaking moves, the positions that have a move into a lost position are won, and the positions all of whose moves lead into won
+# positions are lost. Whatever is left at the end is drawn.
+#
+# Each table is a file named after its material, like KQvKR.tb for king and queen against king and rook, made of a 16 byte header
+# (the bytes CETB, a version byte, the entry size in bytes, the number of pieces, a spare byte and the piece code of each piece
+# padded with 255s to 8 bytes) and then one signed little endian entry per index:
+#     0 is a draw (or an impossible position), v > 0 means the team to move mates in v plies and v < 0 that it is mated in -v - 1 plies
+# Pieces are in table order, which is the white king, the other white pieces from queen down to pawn, then the same for black.
+# Positions that are reflections of each other share one entry: without pawns the board can be mirrored and turned 8 ways, and with
+# pawns only mirrored left to right. Of the reflections of a position the table keeps the one whose king squares, then other
+# squares in table order, come first, so the two kings are always one of a short list of legal king pairs (462 without pawns, 1806
+# with them), and the index is ((white_to_move ? 0 : 1) * num_king_pairs + king_pair) * 64^(n - 2) + the other squares in base 64.
+# Tables are only stored with the stronger material as white, the other way around is probed by flipping the board and the colors.
+# The files are probed through np.memmap, so only the pages that get looked at are ever read.
+#
+# En passant and the 50 move rule are not taken into account. Generating uses 4 bytes per index (the value, whether it is decided
+# and the moves left to refute), on top of the work done a chunk at a time. A 4 piece table has 3.8M indices without pawns and
+# 15M with them, and takes a few minutes. A 5 piece table has 242M indices without pawns and 946M with them.
+#
+#     python Tablebase.py KQvK KRvK KPvK KQvKR
+
+table_magic = b'CETB'
+table_version = 2
+header_size = 16
+max_table_pieces = 5
+default_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+
+piece_letters = "PNBRQK" # by piece type
+piece_letter_values = {'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 0}
+promotion_types = [QUEEN, ROOK, BISHOP, KNIGHT]
+
+OFF = 64 # the square of a piece that isn't on the board, the geometry tables below have an empty row and column for it
+
+def square_table(targets): # [65, 65] bool table from a list of target square lists
+    table = np.zeros([65, 65], np.dtype(bool))
+    for sq in range(64):
+        table[sq, targets[sq]] = True
+    return table
+
+def target_list_table(table): # [65, n] table of the squares each square reaches, padded with OFF
+    targets = [list(np.nonzero(table[sq])[0]) for sq in range(65)]
+    width = max(len(squares) for squares in targets)
+    return np.array([squares + [OFF] * (width - len(squares)) for squares in targets], np.dtype(int))
+
+knight_attack = square_table(knight_targets)
+king_attack = square_table(king_targets)
+pawn_attack = [square_table(pawn_targets[0]), square_table(pawn_targets[1])]
+rook_line = square_table([[target for d in range(8) if is_rook_direction[d] for target in ray_squares[sq][d]] for sq in range(64)])
+bishop_line = square_table([[target for d in range(8) if not is_rook_direction[d] for target in ray_squares[sq][d]] for sq in range(64)])
+queen_line = rook_line | bishop_line
+attack_tables = {KNIGHT: knight_attack, BISHOP: bishop_line, ROOK: rook_line, QUEEN: queen_line, KING: king_attack}
+move_targets = {piece_type: target_list_table(table) for piece_type, table in attack_tables.items()}
+sliders = [BISHOP, ROOK, QUEEN]
+
+def transform_square(sq, symmetry): # symmetries 0 and 1 (none and left to right) are the ones that keep pawns moving the same way
+    row, col = divmod(sq, 8)
+    if (symmetry & 4):
+        row, col = col, row
+    if (symmetry & 2):
+        row = 7 - row
+    if (symmetry & 1):
+        col = 7 - col
+    return (row * 8) + col
+
+symmetry_maps = np.array([[transform_square(sq, symmetry) for sq in range(64)] + [OFF] for symmetry in range(8)], np.dtype(np.int64))
+
+def king_pairs(num_symmetries):
+    # the legal (white king, black king) squares that come first among their reflections, and the index of each in a [4096] table
+    pair_index = np.full(64 * 64, -1, np.dtype(np.int64))
+    pairs = []
+    for white_king in range(64):
+        for black_king in range(64):
+            if (white_king == black_king or king_attack[white_king, black_king]):
+                continue
+            key = (white_king * 64) + black_king
+            if (key == min((symmetry_maps[symmetry][white_king] * 64) + symmetry_maps[symmetry][black_king] for symmetry in range(num_symmetries))):
+                pair_index[key] = len(pairs)
+                pairs.append([white_king, black_king])
+    return pair_index, np.array(pairs, np.dtype(np.int64))
+
+king_pair_tables = {8: king_pairs(8), 2: king_pairs(2)} # by the number of symmetries a table has
+
+between_table = np.zeros([65, 65], np.dtype(np.uint64))
+between_table[:64, :64] = np.array(between, np.dtype(np.uint64))
+square_bits = np.array([1 << sq for sq in range(64)] + [0], np.dtype(np.uint64))
+
+
+def material_codes(name): # the piece codes of a table name like KQvKR, in table order
+    white, black = name.split('v')
+    return [piece_letters.index(letter) for letter in white] + [piece_letters.index(letter) + 6 for letter in black]
+
+def side_letters(codes): # the letters of one team's piece codes, in table order
+    return 'K' + ''.join(sorted((piece_letters[code % 6] for code in codes if code % 6 != KING), key = lambda letter: -piece_letters.index(letter)))
+
+def table_name(codes):
+    # returns the name of the table that holds the pieces with these codes, and whether the colors have to be flipped to look them up in it
+    white = side_letters([code for code in codes if code < 6])
+    black = side_letters([code for code in codes if code >= 6])
+    strength = lambda letters: (sum(piece_letter_values[letter] for letter in letters), letters)
+    if (strength(white) >= strength(black)):
+        return white + 'v' + black, False
+    return black + 'v' + white, True
+
+def table_order(codes, table_codes): # the order to take the pieces with codes in so they match table_codes
+    remaining = list(range(len(codes)))
+    order = []
+    for code in table_codes:
+        i = next(i for i in remaining if codes[i] == code)
+        remaining.remove(i)
+        order.append(i)
+    return order
+
+def num_symmetries(codes):
+    return 2 if any(code % 6 == PAWN for code in codes) else 8
+
+def other_pieces(codes): # the indices of the pieces other than the kings, in table order
+    return [i for i in range(len(codes)) if codes[i] % 6 != KING]
+
+def half_size(codes): # the number of indices with one team to move
+    return len(king_pair_tables[num_symmetries(codes)][1]) * (64 ** (len(codes) - 2))
+
+def table_index(squares, white_to_move, codes):
+    # the index of each row of squares (in table order), found from the reflection of the row that comes first, or -1 if the kings touch
+    pair_index, pairs = king_pair_tables[num_symmetries(codes)]
+    white_king = codes.index(KING)
+    black_king = codes.index(KING + 6)
+    key = None
+    for symmetry in range(num_symmetries(codes)):
+        reflected = symmetry_maps[symmetry][squares]
+        reflected_key = (reflected[:, white_king] * 64) + reflected[:, black_king]
+        for i in other_pieces(codes):
+            reflected_key = (reflected_key * 64) + reflected[:, i]
+        key = reflected_key if key is None else np.minimum(key, reflected_key)
+    rest_size = 64 ** (len(codes) - 2)
+    pair = pair_index[key // rest_size]
+    index = ((np.where(white_to_move, 0, len(pairs)) + pair) * rest_size) + (key % rest_size)
+    return np.where(pair == -1, -1, index)
+
+def index_squares(index, codes): # the inverse of table_index, returns the squares and whether white is to move
+    pair_index, pairs = king_pair_tables[num_symmetries(codes)]
+    rest_size = 64 ** (len(codes) - 2)
+    pair = index // rest_size
+    rest = index % rest_size
+    squares = np.zeros([len(index), len(codes)], np.dtype(np.int64))
+    squares[:, codes.index(KING)] = pairs[pair % len(pairs), 0]
+    squares[:, codes.index(KING + 6)] = pairs[pair % len(pairs), 1]
+    for i in other_pieces(codes)[::-1]:
+        squares[:, i] = rest % 64
+        rest = rest // 64
+    return squares, pair < len(pairs)
+
+def occupancy(squares):
+    occ = np.zeros(len(squares), np.dtype(np.uint64))
+    for i in range(squares.shape[1]):
+        occ |= square_bits[squares[:, i]]
+    return occ
+
+def attacked(squares, codes, targets, by_white, occ): # whether each target square is attacked by the pieces of one team
+    hit = np.zeros(len(targets), np.dtype(bool))
+    for j in range(len(codes)):
+        if ((codes[j] < 6) != by_white):
+            continue
+        piece_type = codes[j] % 6
+        if (piece_type == PAWN):
+            hit |= pawn_attack[0 if by_white else 1][squares[:, j], targets]
+        elif (piece_type in sliders):
+            hit |= attack_tables[piece_type][squares[:, j], targets] & ((between_table[squares[:, j], targets] & occ) == 0)
+        else:
+            hit |= attack_tables[piece_type][squares[:, j], targets]
+    return hit
+
+def is_empty(squares, rows, targets): # whether the targets (one per row, or a column of them per row) hold no piece
+    empty = np.ones(targets.shape, np.dtype(bool))
+    for j in range(squares.shape[1]):
+        empty &= targets != (squares[rows, j] if targets.ndim == 1 else squares[rows, j][:, None])
+    return empty
+
+def decode_value(value): # (1 win, 0 draw or -1 loss for the team to move, plies until checkmate)
+    if (value > 0):
+        return 1, value
+    elif (value < 0):
+        return -1, -value - 1
+    return 0, 0
+
+
+class Tablebase:
+    def __init__(self, directory = default_directory, generate = False):
+        # tables are read from directory, and generated there when they are first needed if generate is set
+        self.directory = directory
+        self.generate_missing = generate
+        self.tables = {} # name -> memmap of the table, or None if there is no file for it
+        self.max_pieces = 0 # the most pieces in any table in the directory, so bigger positions are skipped without looking further
+        if (os.path.isdir(directory)):
+            for file_name in os.listdir(directory):
+                if (file_name.endswith('.tb')):
+                    self.max_pieces = max(self.max_pieces, len(file_name) - 4)
+        if (generate):
+            self.max_pieces = max_table_pieces
+
+    def get_table(self, name):
+        if (name not in self.tables):
+            path = os.path.join(self.directory, name + '.tb')
+            if (not os.path.exists(path) and self.generate_missing):
+                self.generate(name)
+            self.tables[name] = self.open_table(path) if os.path.exists(path) else None
+        return self.tables[name]
+
+    def open_table(self, path):
+        with open(path, 'rb') as file:
+            header = file.read(header_size)
+        if (header[:4] != table_magic or header[4] != table_version):
+            print('not a tablebase file: ' + path)
+            return None
+        dtype = np.dtype('<i1') if header[5] == 1 else np.dtype('<i2')
+        return np.memmap(path, dtype = dtype, mode = 'r', offset = header_size)
+
+    def probe_squares(self, squares, codes, white_to_move):
+        # the table values of positions of the pieces with codes (in any order) on squares, from the view of the team to move,
+        # or None if there is no table for the material
+        name, flipped = table_name(codes)
+        if (flipped):
+            codes = [code + 6 if code < 6 else code - 6 for code in codes]
+            squares = squares ^ 56
+            white_to_move = ~white_to_move
+        table = self.get_table(name)
+        if (table is None):
+            return None
+        table_codes = material_codes(name)
+        return table[table_index(squares[:, table_order(codes, table_codes)], white_to_move, table_codes)]
+
+    def probe(self, board):
+        # (1 win, 0 draw or -1 loss for the team to move, plies until checkmate) for a Board or BitBoard position, or None if it isn't in a table
+        if (board.num_pieces() > self.max_pieces):
+            return None
+        snapshot = board.snapshot()
+        if (snapshot.castling_flags != 0):
+            return None
+        if (snapshot.en_passant_col != -1): # the boards keep the column after every double push, it only matters if a pawn can take
+            row = 4 if snapshot.team_to_move else 3
+            pawn = PAWN if snapshot.team_to_move else PAWN + 6
+            if (any(snapshot.mailbox[(row * 8) + col] == pawn for col in [snapshot.en_passant_col - 1, snapshot.en_passant_col + 1] if 0 <= col < 8)):
+                return None
+        squares = [sq for sq in range(64) if snapshot.mailbox[sq] != EMPTY]
+        values = self.probe_squares(np.array([squares], np.dtype(np.int64)), [snapshot.mailbox[sq] for sq in squares], np.array([snapshot.team_to_move]))
+        if (values is None):
+            return None
+        return decode_value(int(values[0]))
+
+    def gen_moves(self, squares, codes, white_to_move, occ):
+        # every legal move of the team to move, as (row of squares, index of the moving piece, end square, promotion type or -1)
+        rows = []
+        pieces = []
+        ends = []
+        promotions = []
+        all_rows = np.arange(len(squares))
+        for i in range(len(codes)):
+            if ((codes[i] < 6) != white_to_move):
+                continue
+            piece_type = codes[i] % 6
+            if (piece_type != PAWN):
+                targets = move_targets[piece_type][squares[:, i]]
+                ok = (targets != OFF)
+                if (piece_type in sliders):
+                    ok &= (between_table[squares[:, i][:, None], targets] & occ[:, None]) == 0
+                for j in range(len(codes)):
+                    if ((codes[j] < 6) == white_to_move):
+                        ok &= targets != squares[:, j][:, None]
+                row, col = np.nonzero(ok)
+                end = targets[row, col]
+            else:
+                forward = 8 if white_to_move else -8
+                one = squares[:, i] + forward
+                one_empty = is_empty(squares, all_rows, one)
+                two = squares[:, i] + (2 * forward)
+                double = one_empty & ((squares[:, i] // 8) == (1 if white_to_move else 6))
+                double &= is_empty(squares, all_rows, np.where(double, two, OFF))
+                targets = move_targets[KING][squares[:, i]] # the diagonal squares ahead are among the king's
+                capture = pawn_attack[0 if white_to_move else 1][squares[:, i][:, None], targets]
+                enemy = np.zeros(targets.shape, np.dtype(bool))
+                for j in range(len(codes)):
+                    if ((codes[j] < 6) != white_to_move):
+                        enemy |= targets == squares[:, j][:, None]
+                capture_row, capture_col = np.nonzero(capture & enemy)
+                row = np.concatenate([np.nonzero(one_empty)[0], np.nonzero(double)[0], capture_row])
+                end = np.concatenate([one[one_empty], two[double], targets[capture_row, capture_col]])
+            # a pawn move to the last row is one move for each piece it can become
+            promoting = (piece_type == PAWN) & ((end // 8) == (7 if white_to_move else 0))
+            num_promoting = np.count_nonzero(promoting)
+            num_moves = len(row) - num_promoting
+            rows += [row[~promoting]] + [row[promoting]] * len(promotion_types)
+            ends += [end[~promoting]] + [end[promoting]] * len(promotion_types)
+            promotions.append(np.full(num_moves, -1))
+            for promotion in promotion_types:
+                promotions.append(np.full(num_promoting, promotion))
+            pieces.append(np.full(num_moves + (num_promoting * len(promotion_types)), i))
+
+        row = np.concatenate(rows).astype(np.dtype(np.int64))
+        piece = np.concatenate(pieces).astype(np.dtype(np.int64))
+        end = np.concatenate(ends).astype(np.dtype(np.int64))
+        promotion = np.concatenate(promotions).astype(np.dtype(np.int64))
+
+        # the move is legal if the moving team's king isn't attacked afterwards, by any piece that wasn't captured
+        children = squares[row]
+        children[np.arange(len(row)), piece] = end
+        captured = np.full(len(row), -1)
+        for j in range(len(codes)):
+            if ((codes[j] < 6) != white_to_move):
+                captured = np.where(squares[row, j] == end, j, captured)
+                children[:, j] = np.where(captured == j, OFF, children[:, j])
+        king = codes.index(KING if white_to_move else KING + 6)
+        legal = ~attacked(children, codes, children[:, king], not white_to_move, occupancy(children))
+        return row[legal], piece[legal], end[legal], promotion[legal], captured[legal], children[legal]
+
+    def gen_unmoves(self, squares, codes, white_to_move):
+        # the index of every position of the same material one move before each position, listed once for each position it
+        # can move to. white_to_move is the team to move in the positions, so it is the other team that unmakes a move
+        mover_white = not white_to_move
+        occ = occupancy(squares)
+        all_rows = np.arange(len(squares))
+        parents = []
+        children = []
+        for i in range(len(codes)):
+            if ((codes[i] < 6) != mover_white):
+                continue
+            piece_type = codes[i] % 6
+            if (piece_type != PAWN):
+                targets = move_targets[piece_type][squares[:, i]]
+                ok = (targets != OFF) & is_empty(squares, all_rows, targets)
+                if (piece_type in sliders):
+                    ok &= (between_table[squares[:, i][:, None], targets] & occ[:, None]) == 0
+                row, col = np.nonzero(ok)
+                start = targets[row, col]
+            else:
+                backward = -8 if mover_white else 8
+                rank = squares[:, i] // 8
+                one = squares[:, i] + backward
+                one_ok = (rank != (1 if mover_white else 6)) & is_empty(squares, all_rows, one) # pawns never stand on the back rank
+                two_ok = one_ok & (rank == (3 if mover_white else 4))
+                two_ok &= is_empty(squares, all_rows, np.where(two_ok, squares[:, i] + (2 * backward), OFF))
+                row = np.concatenate([np.nonzero(one_ok)[0], np.nonzero(two_ok)[0]])
+                start = np.concatenate([one[one_ok], (squares[:, i] + (2 * backward))[two_ok]])
+            parent = squares[row]
+            parent[:, i] = start
+            # the team that didn't move can't be in check before the move
+            king = codes.index(KING if white_to_move else KING + 6)
+            legal = ~attacked(parent, codes, parent[:, king], mover_white, occupancy(parent))
+            parents.append(table_index(parent[legal], mover_white, codes))
+            children.append(row[legal])
+        # reflections of one parent can all move to a position, and one parent can move to several reflections of it, but each
+        # parent entry takes back one move per position, the same way generate counts the moves that lead into each entry
+        pairs = np.unique((np.concatenate(parents) * len(squares)) + np.concatenate(children))
+        return pairs // len(squares)
+
+    def generate(self, name, chunk_size = 1 << 16):
+        codes = material_codes(name)
+        num_pieces = len(codes)
+        if (num_pieces > max_table_pieces):
+            print('tables with more than ' + str(max_table_pieces) + ' pieces are not supported: ' + name)
+            return
+        start_time = time.time()
+        half = half_size(codes)
+        values = np.zeros(2 * half, np.dtype(np.int16))
+        decided = np.zeros(2 * half, np.dtype(bool))
+        remaining = np.zeros(2 * half, np.dtype(np.int8)) # the moves of each position not yet known to lose
+        win_events = [] # (ply, index) pairs of positions that a capture or promotion wins in that many plies
+        loss_events = [] # and of moves that lose in that many plies
+        frontier = [] # the positions decided at the current ply
+
+        # first pass: every index is checked for being a legal position, and the legal moves of each one are counted, which also finds
+        # checkmates and stalemates. moves that capture or promote leave the table, and their results are looked up in the smaller tables
+        for start in list(range(0, half, chunk_size)) + list(range(half, 2 * half, chunk_size)): # white's half of the table, then black's
+            index = np.arange(start, min(start + chunk_size, half if start < half else 2 * half), dtype = np.dtype(np.int64))
+            squares, white = index_squares(index, codes)
+            white_to_move = bool(white[0])
+            occ = occupancy(squares)
+            valid = table_index(squares, white_to_move, codes) == index # the other reflections of a position are never looked up
+            for i in range(num_pieces):
+                for j in range(i + 1, num_pieces):
+                    valid &= squares[:, i] != squares[:, j]
+                if (codes[i] % 6 == PAWN):
+                    valid &= ((squares[:, i] // 8) != 0) & ((squares[:, i] // 8) != 7)
+            enemy_king = codes.index(KING + 6 if white_to_move else KING)
+            valid &= ~attacked(squares, codes, squares[:, enemy_king], white_to_move, occ)
+            decided[index[~valid]] = True
+
+            index = index[valid]
+            squares = squares[valid]
+            occ = occ[valid]
+            row, piece, end, promotion, captured, children = self.gen_moves(squares, codes, white_to_move, occ)
+            counts = np.bincount(row, minlength = len(index))
+            leaving = (captured != -1) | (promotion != -1)
+
+            # moves that stay in the table are counted once for each entry they lead into, the way the retrograde pass takes them back
+            child_index = table_index(children[~leaving], not white_to_move, codes)
+            staying = np.unique((row[~leaving] * (2 * half)) + child_index) // (2 * half)
+            remaining[index] = np.bincount(staying, minlength = len(index)) + np.bincount(row[leaving], minlength = len(index))
+            own_king = codes.index(KING if white_to_move else KING + 6)
+            in_check = attacked(squares, codes, squares[:, own_king], not white_to_move, occ)
+            values[index[(counts == 0) & in_check]] = -1 # checkmated
+            decided[index[counts == 0]] = True
+            frontier.append(index[(counts == 0) & in_check])
+
+            for piece_index, captured_index, promotion_type in set(zip(np.where(promotion != -1, piece, -1)[leaving], captured[leaving], promotion[leaving])):
+                group = leaving & (captured == captured_index) & (promotion == promotion_type) & ((promotion == -1) | (piece == piece_index))
+                child_codes = list(codes)
+                if (promotion_type != -1):
+                    child_codes[piece_index] = promotion_type + (0 if white_to_move else 6)
+                keep = [j for j in range(num_pieces) if j != captured_index]
+                child_values = self.probe_squares(children[group][:, keep], [child_codes[j] for j in keep], np.full(np.count_nonzero(group), not white_to_move))
+                if (child_values is None):
+                    print('missing table for ' + table_name([child_codes[j] for j in keep])[0] + ', needed by ' + name)
+                    return
+                child_values = np.asarray(child_values, np.dtype(np.int64))
+                parents = index[row[group]]
+                losing = child_values < 0 # the team to move after the move loses, so the move wins
+                win_events.append((-child_values[losing], parents[losing]))
+                winning = child_values > 0
+                loss_events.append((child_values[winning] + 1, parents[winning]))
+
+        win_events = self.sort_events(win_events)
+        loss_events = self.sort_events(loss_events)
+
+        # retrograde pass: results are spread back from the positions decided at each ply to the positions one move before them
+        frontier = np.concatenate(frontier)
+        last_event = max(win_events[0][-1:].tolist() + loss_events[0][-1:].tolist() + [0])
+        ply = 0
+        while (len(frontier) > 0 or ply < last_event):
+            wins = []
+            losses = []
+            for part in range(0, len(frontier), chunk_size):
+                chunk = frontier[part:part + chunk_size]
+                for white_to_move in [True, False]:
+                    side = chunk[(chunk < half) == white_to_move]
+                    if (len(side) == 0):
+                        continue
+                    squares, _ = index_squares(side, codes)
+                    lost = values[side] < 0
+                    if (np.any(lost)):
+                        wins.append(self.gen_unmoves(squares[lost], codes, white_to_move))
+                    if (np.any(~lost)):
+                        losses.append(self.gen_unmoves(squares[~lost], codes, white_to_move))
+
+            ply += 1
+            wins.append(self.events_at(win_events, ply))
+            losses.append(self.events_at(loss_events, ply))
+            wins = np.unique(np.concatenate(wins))
+            wins = wins[~decided[wins]]
+            values[wins] = ply
+            decided[wins] = True
+            losses = np.concatenate(losses)
+            np.subtract.at(remaining, losses, 1)
+            losses = np.unique(losses)
+            losses = losses[(remaining[losses] == 0) & ~decided[losses]]
+            values[losses] = -ply - 1
+            decided[losses] = True
+            frontier = np.concatenate([wins, losses])
+
+        self.save(name, codes, values)
+        num_wins = np.count_nonzero(values > 0)
+        num_losses = np.count_nonzero(values < 0)
+        longest = ('longest mate ' + str(ply - 1) + ' plies') if (num_wins + num_losses > 0) else 'no mates' # the last ply decided nothing
+        print('generated ' + name + ' in ' + str(round(time.time() - start_time, 1)) + 's, ' + longest + ', ' +
+              str(num_wins) + ' wins, ' + str(num_losses) + ' losses')
+
+    def sort_events(self, events): # concatenates (plies, indices) pairs and sorts them by ply
+        plies = np.concatenate([np.zeros(0, np.dtype(np.int64))] + [event[0] for event in events])
+        indices = np.concatenate([np.zeros(0, np.dtype(np.int64))] + [event[1] for event in events])
+        order = np.argsort(plies, kind = 'stable')
+        return plies[order], indices[order]
+
+    def events_at(self, events, ply):
+        plies, indices = events
+        return indices[np.searchsorted(plies, ply, 'left'):np.searchsorted(plies, ply, 'right')]
+
+    def save(self, name, codes, values):
+        entry_size = 1 if np.max(np.abs(values)) <= 127 else 2
+        os.makedirs(self.directory, exist_ok = True)
+        path = os.path.join(self.directory, name + '.tb')
+        with open(path, 'wb') as file:
+            file.write(table_magic + bytes([table_version, entry_size, len(codes), 0]) + bytes(codes + [255] * (8 - len(codes))))
+            values.astype(np.dtype('<i1') if entry_size == 1 else np.dtype('<i2')).tofile(file)
+        self.tables.pop(name, None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'generate endgame tablebases, along with the smaller tables they lead into')
+    parser.add_argument('tables', nargs = '+', help = 'material of each table, like KQvK or KRvKP, stronger side first')
+    parser.add_argument('--directory', default = default_directory, help = 'directory the tables are written to')
+    args = parser.parse_args()
+
+    tablebase = Tablebase(args.directory, generate = True)
+    for name in args.tables:
+        name = table_name(material_codes(name))[0]
+        if (tablebase.get_table(name) is None):
+            print('could not generate ' + name)
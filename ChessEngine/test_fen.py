@@ -0,0 +1,37 @@
+from BoardState import Board
+from BitBoard import BitBoard
+
+# the e6 square is claimed for en passant, but there is no black pawn on e5 that could have just moved two squares
+bad_ep_fen = '4k3/8/8/3P4/8/8/8/4K3 w - e6 0 1'
+
+def test_en_passant_without_a_pawn_is_dropped():
+    for board_class in [Board, BitBoard]:
+        board = board_class(fen = bad_ep_fen)
+        assert board.en_passant_col == -1
+        fen = board.get_fen()
+        assert fen == '4k3/8/8/3P4/8/8/8/4K3 w - - 0 1'
+        moves = board.get_moves_from_state()
+        assert not any(move.is_ep for move in moves)
+        for move in moves:
+            undo_info = board.do_move(move)
+            board.undo_move(*undo_info)
+            assert board.get_fen() == fen
+
+def test_bad_en_passant_column_generates_no_capture():
+    # a column set some other way than through a fen still can't make the boards capture a pawn that isn't there
+    for board_class in [Board, BitBoard]:
+        board = board_class(fen = '4k3/8/8/3P4/8/8/8/4K3 w - - 0 1')
+        board.en_passant_col = 4
+        assert not any(move.is_ep for move in board.get_moves_from_state())
+
+def test_en_passant_round_trip():
+    for board_class in [Board, BitBoard]:
+        board = board_class(fen = '4k3/8/8/3Pp3/8/8/8/4K3 w - e6 0 1')
+        fen = board.get_fen()
+        assert fen == '4k3/8/8/3Pp3/8/8/8/4K3 w - e6 0 1'
+        moves = board.get_moves_from_state()
+        assert [str(move) for move in moves if move.is_ep] == ['d5e6']
+        for move in moves:
+            undo_info = board.do_move(move)
+            board.undo_move(*undo_info)
+            assert board.get_fen() == fen
@@ -5,9 +5,7 @@ moves = ['e2e4', 'd7d5', 'e4d5', 'd8d5', 'c2c4', 'd5c4', 'g1f3', 'c4c1', 'd1c1',
 
 g = Game()
 
-for move in moves:
-    if not g.do_str_move(move):
-        print('failed move ' + str(move))
+g.replay(moves)
 
 
 def give_game():
@@ -0,0 +1,31 @@
+from GameRecord import GameRecordWriter, read_uci, read_pgn
+from Game import Game
+
+def write_lines(path, lines):
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+def test_read_uci_skips_illegal_records(tmp_path):
+    path = str(tmp_path / 'games.uci')
+    write_lines(path, ['1-0\tstartpos\te2e4 e7e5 d1h5 b8c6 f1c4 g8f6 h5f7',
+                       '*\tstartpos\te2e4 d7d5 e4f5', # not en passant, the pawn that moved two squares is on d5
+                       '*\tstartpos\ta1a5', # through the pawn on a2
+                       '*\tstartpos\tg1f3 g8f6 e1g1', # castling through the bishop
+                       '1/2-1/2\t8/8/8/4k3/8/8/8/4K3 w - - 0 1\te1d2'])
+    records = list(read_uci(path))
+    assert [headers['Result'] for headers, game in records] == ['1-0', '1/2-1/2']
+    assert records[0][1].is_game_over() == 1
+    assert records[1][1].get_fen().startswith('8/8/8/4k3/8/8/3K4/8 b')
+
+def test_records_round_trip(tmp_path):
+    game = Game()
+    game.replay(['e2e4', 'e7e5', 'd1h5', 'b8c6', 'f1c4', 'g8f6', 'h5f7'])
+    for format in ['pgn', 'uci']:
+        path = str(tmp_path / ('games.' + format))
+        record = GameRecordWriter(path, format)
+        record.write_game(game)
+        record.close()
+        records = list(read_pgn(path) if format == 'pgn' else read_uci(path))
+        assert len(records) == 1
+        assert records[0][0]['Result'] == '1-0'
+        assert records[0][1].get_board_hash() == game.get_board_hash()
@@ -1,6 +1,6 @@
 import pygame, sys, random
 sys.path.append('../ChessEngine/')
-from Game import Game
+from Game import Game, mover_reward
 sys.path.append('../Bot/')
 import Bot
 from NNet import init_nnet, train_nnet
@@ -218,7 +218,7 @@ while (playing and games_played < num_games):
 
     result = ChessGame.is_game_over(print_reason = True)
     if (result != -1):
-        current_example = Bot.assign_rewards(current_example, result)
+        current_example = Bot.assign_rewards(current_example, mover_reward(result))
         games_played += 1
         total_examples += current_example
         is_bot_turn = not (games_played < (num_games / 2))